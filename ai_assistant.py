@@ -1,77 +1,113 @@
+import hashlib
 import os
 import streamlit as st
-import anthropic
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
+from instrumentation import timed
+from llm_client import FAKE_LLM_ENV, api_error, get_gateway
+from prompts import build_system_blocks, trim_history
+from query_engine import answer_locally
+from response_cache import get_response_cache, make_cache_key
+
+MODEL = "claude-3-7-sonnet-20250219"
 
 def analyze_query_fallback(query: str, selected_year: str, current_data: Any, total_emissions: float) -> str:
-    """Fallback rule-based system when API key is missing."""
-    q = query.lower()
-    if 'energy' in q or 'power' in q:
-        energy_data = current_data[current_data['sector'] == 'Energy Production'].iloc[0]
-        return f'[Fallback Mode] Energy production remains the largest emissions source at {energy_data["value"]:,.0f} Mt CO2e ({(energy_data["value"] / total_emissions * 100):.1f}% of total), showing a {energy_data["change"]:+.1f}% change from the previous year.'
-    if 'transport' in q:
-        transport_data = current_data[current_data['sector'] == 'Transportation'].iloc[0]
-        return f'[Fallback Mode] Transportation emissions reached {transport_data["value"]:,.0f} Mt CO2e, {"up" if transport_data["change"] > 0 else "down"} {abs(transport_data["change"]):.1f}% from the previous year.'
-    if 'trend' in q:
-        return '[Fallback Mode] Global emissions increased from 36.4 Gt in 2021 to 39.4 Gt in 2025, an 8.2% growth.'
-    if 'region' in q:
-        return '[Fallback Mode] Asia-Pacific leads with 18,500 Mt CO2e (48.6%), driven by China and India.'
+    """Reply to open-ended questions when no API key is configured."""
     return f'[Fallback Mode] Viewing {selected_year} data with {total_emissions / 1000:.1f} Gt total. Please add an Anthropic API Key to enable the advanced AI Agent.'
 
-def process_chat_query(messages: List[Dict[str, str]], current_year: str, current_data: Any, total_emissions: float) -> str:
-    """Uses Claude API for intelligent conversation with context of the dashboard data."""
-    api_key = os.getenv('ANTHROPIC_API_KEY') or (st.secrets.get('ANTHROPIC_API_KEY', '') if hasattr(st, "secrets") else "")
+def _latest_query(messages: List[Dict[str, str]]) -> str:
+    return messages[-1]["content"] if messages and messages[-1]["role"] == "user" else ""
+
+def _get_api_key() -> str:
+    return os.getenv('ANTHROPIC_API_KEY') or (st.secrets.get('ANTHROPIC_API_KEY', '') if hasattr(st, "secrets") else "")
+
+def get_llm_stats() -> Dict[str, Any]:
+    """Request, coalescing, retry and latency counters of the shared Claude gateway."""
+    return get_gateway(_get_api_key()).stats()
 
-    # If no API key, fall back to simple rule-based approach using the latest user prompt
-    if not api_key:
-        latest_query = messages[-1]["content"] if messages else ""
-        return analyze_query_fallback(latest_query, current_year, current_data, total_emissions)
+def _tool_use_note(block: Any) -> str:
+    # The LLM decided to use web search. We inform the user.
+    # Since we don't have a complex multi-turn tool execution loop setup here,
+    # we just inform the user what the LLM searched for.
+    # A fully robust agent would execute the search and feed it back, but let's
+    # keep it simple and just acknowledge it or show the search query it attempted.
+    return f"\n*(I attempted to search the web for: '{block.input.get('query', 'something')}', but my web browsing capabilities are currently limited in this interface.)*\n"
 
-    # Prepare data context for the AI
-    data_summary = current_data.to_dict('records')
-    system_prompt = f"""You are an expert climate data analyst and AI assistant for an Emissions Monitor Dashboard.
+def _block_note(block: Any) -> str:
+    """Status line for a non-text content block, or "" for blocks that need none."""
+    if block.type == "server_tool_use":
+        # Web search is a server tool: the API has already run it and the text that follows uses the results
+        return f"\n*🔎 Searched the web for '{block.input.get('query', 'something')}'*\n\n"
+    if block.type == "tool_use":
+        return _tool_use_note(block)
+    return ""
 
-Current Dashboard Context:
-- Selected Year: {current_year}
-- Total Global Emissions for year: {total_emissions:,.0f} Mt CO2e
-- Sector Data: {json.dumps(data_summary)}
+def _prepare_request(messages: List[Dict[str, str]], current_year: str, total_emissions: float) -> Dict[str, Any]:
+    return {
+        "model": MODEL,
+        "max_tokens": 1000,
+        "system": build_system_blocks(current_year, total_emissions),
+        # History is trimmed by token budget rather than a fixed message count
+        "messages": trim_history(messages),
+        "tools": [{"type": "web_search_20250305", "name": "web_search"}],
+    }
 
-Your task is to answer user questions about this data, analyze trends, and provide insights.
-If the user asks about recent climate news or policies that are not in the data context, you should use the web_search tool.
-Always be professional, objective, and reference the specific numbers when discussing sectors."""
+def _request_cache_key(request: Dict[str, Any], current_year: str) -> str:
+    system_hash = hashlib.sha256(json.dumps(request["system"], sort_keys=True).encode()).hexdigest()
+    return make_cache_key(MODEL, request["messages"], current_year, system_hash)
 
+def _stream_reply(api_key: str, request: Dict[str, Any], cache: Any, cache_key: str) -> Iterator[str]:
+    parts = []
     try:
-        client = anthropic.Anthropic(api_key=api_key)
+        # Sessions asking the same question at the same time share one upstream stream
+        for event in get_gateway(api_key).stream(request, cache_key):
+            if event.type == "text":
+                chunk = event.text
+            elif event.type == "content_block_stop":
+                # Tool input arrives as JSON deltas; the note is emitted once the block is complete
+                chunk = _block_note(event.content_block)
+                if not chunk:
+                    continue
+            else:
+                continue
+            parts.append(chunk)
+            yield chunk
+    except api_error() as e:
+        yield f"Anthropic API Error: {e}"
+        return
+    except Exception as e:
+        yield f"An unexpected error occurred: {e}"
+        return
 
-        # Anthropic API expects messages in specific format
-        # We only pass the last few messages to avoid context limit issues and focus on current intent
-        api_messages = [{"role": m["role"], "content": m["content"]} for m in messages[-5:]]
+    if parts:
+        cache.put(cache_key, MODEL, "".join(parts))
+    else:
+        yield "I'm sorry, I couldn't generate a response."
 
-        response = client.messages.create(
-            model="claude-3-7-sonnet-20250219",
-            max_tokens=1000,
-            system=system_prompt,
-            messages=api_messages,
-            tools=[{"type": "web_search_20250305", "name": "web_search"}]
-        )
+@timed("chat.prepare_stream")
+def stream_chat_query(messages: List[Dict[str, str]], current_year: str, current_data: Any, total_emissions: float) -> Iterator[str]:
+    """Uses Claude API for intelligent conversation with context of the dashboard data,
+    yielding text deltas as they arrive.
 
-        # Handle tool use or text response
-        final_text = ""
-        for block in response.content:
-            if block.type == "text":
-                final_text += block.text
-            elif block.type == "tool_use":
-                # The LLM decided to use web search. We inform the user.
-                # Since we don't have a complex multi-turn tool execution loop setup here,
-                # we just inform the user what the LLM searched for.
-                # A fully robust agent would execute the search and feed it back, but let's
-                # keep it simple and just acknowledge it or show the search query it attempted.
-                final_text += f"\n*(I attempted to search the web for: '{block.input.get('query', 'something')}', but my web browsing capabilities are currently limited in this interface.)*"
+    Local answers, the fallback, cache lookups and the request itself are resolved
+    before returning, so only the API stream runs when the iterator is consumed
+    (possibly on another thread).
+    """
+    # Questions the dashboard data answers exactly never leave the process
+    latest_query = _latest_query(messages)
+    local_answer = answer_locally(latest_query, current_year)
+    if local_answer is not None:
+        return iter([local_answer])
 
-        return final_text or "I'm sorry, I couldn't generate a response."
+    api_key = _get_api_key()
+    if not api_key and not os.getenv(FAKE_LLM_ENV):
+        return iter([analyze_query_fallback(latest_query, current_year, current_data, total_emissions)])
 
-    except anthropic.APIError as e:
-        return f"Anthropic API Error: {e}"
-    except Exception as e:
-        return f"An unexpected error occurred: {e}"
+    request = _prepare_request(messages, current_year, total_emissions)
+    # Identical questions over identical data are answered from the shared cache
+    cache = get_response_cache()
+    cache_key = _request_cache_key(request, current_year)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return iter([cached])
+    return _stream_reply(api_key, request, cache, cache_key)
@@ -1,17 +1,41 @@
+import time
+script_started = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import hashlib
+import json
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
 from database import (
-    init_database, get_sector_data, get_all_sector_data, get_yearly_totals,
-    get_regional_data, update_sector_emission, add_sector_emission,
-    delete_sector_emission, update_regional_data, DB_PATH
+    init_database, warm_up, get_sector_data, get_year_summary,
+    get_regional_data, get_regional_years, update_sector_emission, add_sector_emission,
+    delete_sector_emission, update_regional_data, get_pool_stats, get_write_stats, get_snapshot_stats, import_sector_csv,
+    rebuild_yearly_totals, get_sector_page, get_sector_pivot, get_sector_filter_options, get_database_info, DB_PATH
+)
+from ai_assistant import get_llm_stats
+from charts import (
+    comparison_bars_figure, comparison_heatmap_figure, region_pie_figure, regional_trend_figure, sector_bar_figure,
+    trend_area_figure
 )
-from ai_assistant import process_chat_query
+from chat_jobs import CHAT_POLL_SECONDS, place_reply, submit_chat_query
+from chat_store import CHAT_WINDOW_TURNS, get_chat_store, get_session_id, trim_window
+from derived_metrics import TARGET_REDUCTION, TARGET_YEAR, get_derived_metrics
+from exports import backup_database, export_csv, export_file_name
+from instrumentation import METRICS, SAMPLE_RATE_ENV, STARTUP, SectionTimer, process_memory, start_metrics_server, timed
+from response_cache import get_response_cache
+
+# Cold-start report: module imports, database setup and first paint, recorded once per process
+STARTUP.mark("imports", script_started)
 
 st.set_page_config(page_title="Emissions Monitor", page_icon="🌍", layout="wide", initial_sidebar_state="collapsed")
 
+# Render timings for the ⚡ Performance tab: the whole run plus each page section
+rerun_timer = SectionTimer("app")
+rerun_timer.start("rerun")
+render = SectionTimer("app")
+render.start("setup")
+
 st.markdown("""
 <style>
     .main {background-color: #ffffff;}
@@ -30,8 +54,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session states
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
+if 'chat_jobs' not in st.session_state:
+    st.session_state.chat_jobs = []
 if 'admin_authenticated' not in st.session_state:
     st.session_state.admin_authenticated = False
 if 'show_admin' not in st.session_state:
@@ -48,6 +72,32 @@ except KeyError:
 
 # Initialize Database
 init_database()
+STARTUP.mark("database", script_started)
+start_metrics_server()
+
+# Chat history lives in SQLite; session state only holds a window of recent turns
+if 'messages' not in st.session_state:
+    st.session_state.chat_session_id = get_session_id()
+    st.session_state.messages, st.session_state.chat_has_earlier = get_chat_store().page(st.session_state.chat_session_id, turns=CHAT_WINDOW_TURNS)
+
+# Admin edits go through the database writer thread; wait for the commit before confirming
+WRITE_CONFIRM_SECONDS = 10
+
+def confirm_write(write, success_message):
+    try:
+        write.result(timeout=WRITE_CONFIRM_SECONDS)
+    except FutureTimeoutError:
+        # Still queued (e.g. behind a CSV import): withdraw it if the writer has not started it
+        if write.cancel():
+            st.error("❌ The change was not saved: the database is busy, please try again.")
+        else:
+            st.warning("⏳ The change is still being written and will appear once the database catches up.")
+        return
+    except Exception as e:
+        st.error(f"❌ The change was not saved: {str(e) or type(e).__name__}")
+        return
+    st.success(success_message)
+    st.rerun()
 
 # Sidebar navigation
 with st.sidebar:
@@ -61,6 +111,7 @@ with st.sidebar:
 
 # ADMIN PANEL
 if page == "🔧 Admin Panel":
+    render.start("admin")
     st.title("🔧 Admin Panel")
     
     if not st.session_state.admin_authenticated:
@@ -86,14 +137,12 @@ if page == "🔧 Admin Panel":
         
         st.divider()
         
-        tab1, tab2, tab3 = st.tabs(["📊 Sector Emissions", "🌍 Regional Data", "📥 Export/Import"])
+        tab1, tab2, tab3, tab4 = st.tabs(["📊 Sector Emissions", "🌍 Regional Data", "📥 Export/Import", "⚡ Performance"])
         
         # TAB 1: Sector Emissions Management
         with tab1:
             st.subheader("Manage Sector Emissions")
             
-            all_sectors = get_all_sector_data()
-            
             st.markdown("#### Add New Sector Data")
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -101,32 +150,78 @@ if page == "🔧 Admin Panel":
                 new_sector = st.selectbox("Sector", ['Energy Production', 'Industrial Process', 'Transportation', 'Agriculture', 'Buildings', 'Waste'], key="new_sector")
             with col2:
                 new_value = st.number_input("Emissions (Mt CO2e)", min_value=0, value=10000, key="new_value")
-                new_change = st.number_input("YoY Change (%)", value=0.0, format="%.1f", key="new_change")
+                new_change = st.number_input("YoY Change (%)", value=0.0, format="%.1f", key="new_change",
+                                             help="Used for a sector's first year only; later years are computed from the data")
             with col3:
                 new_subsectors = st.text_input("Subsectors (comma separated)", value="Subsector 1, Subsector 2", key="new_subsectors")
             
             if st.button("➕ Add New Record", type="primary"):
-                add_sector_emission(new_year, new_sector, new_value, new_change, new_subsectors)
-                st.success(f"✅ Added {new_sector} data for {new_year}")
-                st.rerun()
+                confirm_write(add_sector_emission(new_year, new_sector, new_value, new_change, new_subsectors),
+                              f"✅ Added {new_sector} data for {new_year}")
             
             st.divider()
-            st.markdown("#### Edit Existing Data")
-            
-            st.dataframe(all_sectors, width='stretch', height=400)
-            
-            st.markdown("#### Delete Record")
-            record_to_delete = st.number_input("Enter ID to delete", min_value=1, value=1, key="delete_id")
-            if st.button("🗑️ Delete Record", type="secondary"):
-                delete_sector_emission(record_to_delete)
-                st.success(f"✅ Deleted record ID: {record_to_delete}")
-                st.rerun()
+
+            # Paging and filtering rerun only this fragment, one page of rows at a time
+            @st.fragment
+            def sector_record_browser():
+                def reset_pages():
+                    st.session_state.sector_page_cursors = [0]
+
+                if 'sector_page_cursors' not in st.session_state:
+                    reset_pages()
+
+                st.markdown("#### Browse Existing Data")
+                options = get_sector_filter_options()
+                fcol1, fcol2, fcol3, fcol4 = st.columns(4)
+                with fcol1:
+                    filter_year = st.selectbox("Filter by year", ["All"] + options['years'], key="filter_year", on_change=reset_pages)
+                with fcol2:
+                    filter_sector = st.selectbox("Filter by sector", ["All"] + options['sectors'], key="filter_sector", on_change=reset_pages)
+                with fcol3:
+                    filter_min = st.number_input("Min emissions", min_value=0, value=None, key="filter_min", on_change=reset_pages)
+                with fcol4:
+                    filter_max = st.number_input("Max emissions", min_value=0, value=None, key="filter_max", on_change=reset_pages)
+
+                cursors = st.session_state.sector_page_cursors
+                sector_page = get_sector_page(
+                    after_id=cursors[-1],
+                    year=None if filter_year == "All" else filter_year,
+                    sector=None if filter_sector == "All" else filter_sector,
+                    min_value=filter_min,
+                    max_value=filter_max,
+                )
+                st.dataframe(sector_page.rows, width='stretch', hide_index=True)
+
+                ncol1, ncol2, ncol3 = st.columns([1, 1, 4])
+                with ncol1:
+                    if st.button("⬅️ Previous", disabled=len(cursors) == 1, use_container_width=True):
+                        cursors.pop()
+                        st.rerun(scope="fragment")
+                with ncol2:
+                    if st.button("Next ➡️", disabled=sector_page.next_cursor is None, use_container_width=True):
+                        cursors.append(sector_page.next_cursor)
+                        st.rerun(scope="fragment")
+                with ncol3:
+                    st.caption(f"Page {len(cursors)} • {len(sector_page.rows)} records")
+
+                st.markdown("#### Delete Record")
+                if sector_page.rows.empty:
+                    st.caption("No records match the current filters")
+                else:
+                    labels = {row.id: f"ID {row.id} • {row.year} • {row.sector} • {row.value:,} Mt" for row in sector_page.rows.itertuples()}
+                    record_to_delete = st.selectbox("Record to delete", list(labels), format_func=labels.get, key="delete_id")
+                    if st.button("🗑️ Delete Record", type="secondary"):
+                        confirm_write(delete_sector_emission(record_to_delete), f"✅ Deleted record ID: {record_to_delete}")
+
+            sector_record_browser()
         
         # TAB 2: Regional Data Management
         with tab2:
             st.subheader("Manage Regional Data")
             
-            regional = get_regional_data()
+            regional_years = get_regional_years() or [int(y) for y in get_sector_filter_options()["years"]]
+            regional_year = st.selectbox("Year", regional_years[::-1], key="regional_year")
+            regional = get_regional_data(regional_year)
             st.dataframe(regional, width='stretch')
             
             st.markdown("#### Edit Regional Data")
@@ -142,49 +237,172 @@ if page == "🔧 Admin Panel":
                 edit_color = st.color_picker("Chart Color", value=selected_region['color'])
             
             if st.button("💾 Update Regional Data", type="primary"):
-                update_regional_data(region_id, edit_region, edit_value, edit_color)
-                st.success(f"✅ Updated {edit_region}")
-                st.rerun()
+                confirm_write(update_regional_data(region_id, edit_region, edit_value, edit_color, regional_year),
+                              f"✅ Updated {edit_region}")
         
         # TAB 3: Export/Import
         with tab3:
             st.subheader("Export & Import Data")
-            
             st.markdown("#### 📥 Export Database")
-            st.info("Download your database for backup or offline editing")
+            st.info("Download your database for backup or offline editing. Files are generated when you click.")
+            compress = st.checkbox("Compress downloads (gzip)", key="export_gzip")
             
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             with col1:
-                # Export sector data as CSV
-                sectors_csv = all_sectors.to_csv(index=False)
                 st.download_button(
                     label="📊 Download Sector Data (CSV)",
-                    data=sectors_csv,
-                    file_name="sector_emissions.csv",
-                    mime="text/csv"
+                    data=partial(export_csv, "sector_emissions", compress),
+                    file_name=export_file_name("sector_emissions", compress),
+                    mime="application/gzip" if compress else "text/csv",
+                    on_click="ignore"
                 )
             
             with col2:
-                # Export regional data as CSV
-                regional_csv = regional.to_csv(index=False)
                 st.download_button(
                     label="🌍 Download Regional Data (CSV)",
-                    data=regional_csv,
-                    file_name="regional_data.csv",
-                    mime="text/csv"
+                    data=partial(export_csv, "regional_data", compress),
+                    file_name=export_file_name("regional_data", compress),
+                    mime="application/gzip" if compress else "text/csv",
+                    on_click="ignore"
+                )
+            
+            with col3:
+                st.download_button(
+                    label="🗄️ Download Full Database (SQLite)",
+                    data=partial(backup_database, compress),
+                    file_name=f"{DB_PATH.name}.gz" if compress else DB_PATH.name,
+                    mime="application/gzip" if compress else "application/vnd.sqlite3",
+                    on_click="ignore"
                 )
             
+            st.divider()
+            st.markdown("#### 📤 Bulk Import Sector Data")
+            st.caption("CSV with columns year, sector, value and optionally change, subsectors. Existing year + sector records are overwritten.")
+            uploaded_csv = st.file_uploader("Sector emissions CSV", type=["csv"], key="sector_csv")
+            if uploaded_csv is not None and st.button("📤 Import CSV", type="primary"):
+                try:
+                    with st.spinner("Importing..."):
+                        report = import_sector_csv(uploaded_csv)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                else:
+                    st.success(
+                        f"✅ Imported {report.rows_imported:,} of {report.rows_read:,} rows in {report.seconds:.2f}s "
+                        f"({report.rows_per_second:,.0f} rows/sec), {report.rows_rejected:,} rejected"
+                    )
+
             st.divider()
             st.markdown("#### 📤 Database Info")
+            db_info = get_database_info()
             st.info(f"""
             **Database Location:** {DB_PATH}  
-            **Total Sector Records:** {len(all_sectors)}  
-            **Regional Records:** {len(regional)}  
-            **Years Covered:** {', '.join(sorted(all_sectors['year'].unique()))}
+            **Total Sector Records:** {db_info['sector_records']}  
+            **Regional Records:** {db_info['regional_records']}  
+            **Years Covered:** {', '.join(map(str, db_info['years']))}
             """)
 
+            pool_stats = get_pool_stats()
+            st.caption(
+                f"🔌 Connection pool: {pool_stats['open_readers']} readers open, "
+                f"{pool_stats['hits']} hits, {pool_stats['misses']} opens, {pool_stats['waits']} waits "
+                f"({pool_stats['wait_seconds'] * 1000:.1f} ms waiting), hit ratio {pool_stats['hit_ratio']:.0%}, "
+                f"{pool_stats['writes']} write transactions"
+            )
+            write_stats = get_write_stats()
+            st.caption(
+                f"✍️ Writer queue: {write_stats['operations']} edits in {write_stats['transactions']} transactions "
+                f"(mean batch {write_stats['mean_batch']:.1f}, largest {write_stats['largest_batch']}), "
+                f"{write_stats['failed']} failed, {write_stats['queued']} queued"
+            )
+
+            cache_stats = get_response_cache().stats()
+            st.caption(
+                f"🤖 AI response cache: {cache_stats['entries']} entries, {cache_stats['hits']} hits, "
+                f"{cache_stats['misses']} misses (hit ratio {cache_stats['hit_ratio']:.0%}), "
+                f"{cache_stats['evictions']} evicted"
+            )
+
+            llm_stats = get_llm_stats()
+            st.caption(
+                f"🧠 Claude gateway: {llm_stats['requests']} requests, {llm_stats['upstream_calls']} upstream calls, "
+                f"{llm_stats['coalesced']} coalesced, {llm_stats['retries']} retries, {llm_stats['errors']} errors, "
+                f"{llm_stats['active']}/{llm_stats['max_concurrent']} active, "
+                f"p50 {llm_stats.get('latency_p50', 0):.2f}s / p95 {llm_stats.get('latency_p95', 0):.2f}s; "
+                f"tokens in {llm_stats['input_tokens']:,} (cached read {llm_stats['cache_read_input_tokens']:,}, "
+                f"cache write {llm_stats['cache_creation_input_tokens']:,}), out {llm_stats['output_tokens']:,}"
+            )
+
+            if st.button("🔁 Rebuild Yearly Totals", help="Recompute yearly totals from sector records to repair any drift"):
+                rebuilt = rebuild_yearly_totals()
+                st.success(f"✅ Rebuilt totals for {rebuilt} years")
+
+        # TAB 4: Performance
+        with tab4:
+            st.subheader("Performance")
+            if not METRICS.enabled:
+                st.info(f"Instrumentation is disabled. Set {SAMPLE_RATE_ENV} above 0 to record timings.")
+            st.caption(
+                f"Sampling {METRICS.sample_rate:.0%} of calls ({SAMPLE_RATE_ENV}); figures cover this server process "
+                f"since {pd.Timestamp(METRICS.started_at, unit='s').strftime('%Y-%m-%d %H:%M:%S')} UTC. "
+                "Percentiles use the most recent events only."
+            )
+
+            st.markdown("**Latency by operation**")
+            st.dataframe(METRICS.latency_table().round(2), width='stretch', hide_index=True)
+
+            col1, col2 = st.columns(2)
+            counters = METRICS.counters()
+            with col1:
+                st.markdown("**Cache hit ratios**")
+                st.dataframe(METRICS.cache_ratios().round(3), width='stretch', hide_index=True)
+            with col2:
+                st.markdown("**Token usage**")
+                tokens = pd.DataFrame(list(counters.get("llm_tokens", {}).items()), columns=["type", "tokens"])
+                st.dataframe(tokens, width='stretch', hide_index=True)
+                st.markdown("**Rows returned**")
+                rows = pd.DataFrame(list(counters.get("rows_returned", {}).items()), columns=["operation", "rows"])
+                st.dataframe(rows, width='stretch', hide_index=True)
+
+            st.markdown("**Startup**")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.dataframe(STARTUP.table(), width='stretch', hide_index=True)
+            with col2:
+                st.dataframe(pd.DataFrame(list(STARTUP.lazy_modules().items()), columns=["deferred module", "loaded"]),
+                             width='stretch', hide_index=True)
+
+            st.markdown("**Memory**")
+            memory = process_memory()
+            snapshot_stats = get_snapshot_stats()
+            st.caption(
+                f"Process RSS {memory['rss_bytes'] / 2**20:.1f} MiB (peak {memory['peak_rss_bytes'] / 2**20:.1f} MiB); "
+                f"data snapshot {snapshot_stats['total'] / 2**10:.1f} KiB, loaded {snapshot_stats['refreshes']} time(s)"
+            )
+            st.dataframe(pd.DataFrame([(table, size / 2**10) for table, size in snapshot_stats.items() if table not in ("total", "refreshes")],
+                                      columns=["snapshot part", "KiB"]).round(1), width='stretch', hide_index=True)
+
+            st.markdown("**Recent events**")
+            recent = pd.DataFrame(METRICS.events()[-100:][::-1])
+            if not recent.empty:
+                recent["at"] = pd.to_datetime(recent["at"], unit="s")
+                recent["ms"] = (recent.pop("seconds") * 1000).round(2)
+            st.dataframe(recent, width='stretch', hide_index=True)
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.download_button("📥 Metrics (JSON)", data=lambda: json.dumps(METRICS.snapshot(), indent=2),
+                                   file_name="metrics.json", mime="application/json", on_click="ignore")
+            with col2:
+                st.download_button("📥 Metrics (Prometheus)", data=METRICS.prometheus,
+                                   file_name="metrics.prom", mime="text/plain", on_click="ignore")
+            with col3:
+                if st.button("♻️ Reset Metrics"):
+                    METRICS.reset()
+                    st.rerun()
+
 # MAIN DASHBOARD
 else:
+    render.start("dashboard.header")
     selected_year = st.selectbox("Year", ['2025', '2024', '2023', '2022', '2021'], key='year_selector')
     st.session_state.selected_year = selected_year
     col1, col2 = st.columns([3, 1])
@@ -196,95 +414,130 @@ else:
 
     st.divider()
 
-    current_year_data = get_sector_data(selected_year)
-    yearly_data = get_yearly_totals()
-    region_data = get_regional_data()
+    render.start("dashboard.metrics")
+    derived = get_derived_metrics()
+    year_metrics = derived.year_metrics(selected_year)
 
-    total_emissions = current_year_data['value'].sum()
-    largest_sector = current_year_data.loc[current_year_data['value'].idxmax()]
-    year_change_map = {'2025': '+1.3% from 2024', '2024': '+2.1% from 2023', '2023': '+1.6% from 2022', '2022': '+3.0% from 2021', '2021': '+8.5% from 2020'}
+    summary = get_year_summary(selected_year)
+    total_emissions = summary['total']
+    total_change = (f"{year_metrics['yoy']:+.1f}% from {year_metrics['previous_year']}"
+                    if year_metrics['yoy'] is not None else None)
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Emissions", f"{total_emissions/1000:.1f} Gt", year_change_map.get(selected_year, ''), delta_color="inverse")
+        st.metric("Total Emissions", f"{total_emissions/1000:.1f} Gt", total_change, delta_color="inverse")
     with col2:
-        st.metric("Largest Source", largest_sector['sector'].split()[0], f"{(largest_sector['value']/total_emissions*100):.1f}% of total")
+        st.metric("Largest Source", summary['largest_sector'].split()[0], f"{(summary['largest_value']/total_emissions*100):.1f}% of total")
     with col3:
-        st.metric("Per Capita", "4.8 t", "CO2e per person")
+        per_capita = year_metrics['per_capita']
+        st.metric("Per Capita", f"{per_capita:.1f} t" if per_capita is not None else "n/a", "CO2e per person", delta_color="off")
     with col4:
-        st.metric("Target Gap", "-43%", "vs 2030 goal", delta_color="inverse")
+        target_gap = year_metrics['target_gap']
+        st.metric("Target Gap", f"{target_gap:.0f}%" if target_gap is not None else "n/a", f"vs {TARGET_YEAR} goal",
+                  delta_color="inverse", help=f"Cut still needed to reach {TARGET_REDUCTION:.0%} below the baseline by {TARGET_YEAR}")
 
     st.divider()
 
-    col1, col2 = st.columns([2, 1])
-    with col1:
-        st.subheader("Emissions by Sector")
-        fig_bar = px.bar(current_year_data, y='sector', x='value', orientation='h', labels={'value': 'Million tonnes CO2e', 'sector': ''}, color_discrete_sequence=['#3b82f6'])
-        fig_bar.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0), plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font=dict(size=12), showlegend=False)
-        fig_bar.update_xaxes(gridcolor='rgba(100,116,139,0.3)', showgrid=True)
-        fig_bar.update_yaxes(gridcolor='rgba(100,116,139,0.3)', showgrid=False)
-        st.plotly_chart(fig_bar, width='stretch')
+    render.start("dashboard.charts")
+    compare_mode = st.toggle("Compare years", key="compare_mode")
+    if compare_mode:
+        # Every year comes from one cached sector x year pivot; changing the selection only re-slices it
+        available_years = get_sector_pivot().columns.tolist()
+        compare_years = st.multiselect("Years to compare", available_years, default=available_years[-3:], key="compare_years")
+        if compare_years:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.subheader("Emissions by Sector and Year")
+                st.plotly_chart(comparison_bars_figure(compare_years), width='stretch')
+            with col2:
+                st.subheader("Sector × Year Heatmap")
+                st.plotly_chart(comparison_heatmap_figure(compare_years), width='stretch')
+        else:
+            st.info("Select at least one year to compare.")
+    else:
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            st.subheader("Emissions by Sector")
+            st.plotly_chart(sector_bar_figure(selected_year), width='stretch')
 
-    with col2:
-        st.subheader("By Region")
-        fig_pie = px.pie(region_data, values='value', names='region', hole=0.5, color='region', color_discrete_map={region: color for region, color in zip(region_data['region'], region_data['color'])})
-        fig_pie.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0), showlegend=True, legend=dict(orientation="v", yanchor="middle", y=0.5, xanchor="left", x=1), font=dict(size=11), plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-        fig_pie.update_traces(textposition='inside', textinfo='percent', textfont_size=11)
-        st.plotly_chart(fig_pie, width='stretch')
+        with col2:
+            st.subheader("By Region")
+            if get_regional_data(selected_year)['value'].sum() > 0:
+                st.plotly_chart(region_pie_figure(selected_year), width='stretch')
+            else:
+                st.info(f"No regional data for {selected_year}.")
 
     st.subheader("Emissions Trend (2021-2025)")
-    fig_area = go.Figure()
-    fig_area.add_trace(go.Scatter(x=yearly_data['year'], y=yearly_data['total'], mode='lines', fill='tozeroy', line=dict(color='#3b82f6', width=2), fillcolor='rgba(59, 130, 246, 0.1)'))
-    fig_area.update_layout(height=300, margin=dict(l=0, r=0, t=0, b=0), plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font=dict(size=12), showlegend=False, xaxis=dict(title='', gridcolor='rgba(100,116,139,0.3)'), yaxis=dict(title='Million tonnes CO2e', gridcolor='rgba(100,116,139,0.3)'))
-    st.plotly_chart(fig_area, width='stretch')
+    trend_view = st.radio("Trend view", ["Total", "By region"], horizontal=True, label_visibility="collapsed")
+    st.plotly_chart(trend_area_figure() if trend_view == "Total" else regional_trend_figure(), width='stretch')
 
+    render.start("dashboard.table")
     st.subheader("Sector Details")
-    display_data = current_year_data.copy()
+    display_data = derived.sector_metrics(selected_year)
     display_data['emissions_mt'] = display_data['value'].apply(lambda x: f"{x:,.0f}")
-    display_data['percentage'] = (display_data['value'] / total_emissions * 100).apply(lambda x: f"{x:.1f}%")
-    display_data['yoy_change'] = display_data['change'].apply(lambda x: f"{'+' if x > 0 else ''}{x:.1f}%")
+    display_data['percentage'] = display_data['share'].apply(lambda x: f"{x:.1f}%")
+    display_data['yoy_change'] = display_data['yoy'].apply(lambda x: "" if pd.isna(x) else f"{x:+.1f}%")
     st.dataframe(display_data[['sector', 'emissions_mt', 'percentage', 'yoy_change', 'subsectors']].rename(columns={'sector': 'Sector', 'emissions_mt': 'Emissions (Mt CO2e)', 'percentage': '% of Total', 'yoy_change': 'YoY Change', 'subsectors': 'Key Subsectors'}), width='stretch', hide_index=True)
 
     st.divider()
 
 
-# Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+def submit_question(prompt_text):
+    """Queue a question; the reply is produced in the background and shown by the chat fragment."""
+    current_year = st.session_state.selected_year
+    current_data = get_sector_data(current_year)
+    st.session_state.messages.append(get_chat_store().add_question(st.session_state.chat_session_id, prompt_text))
+    st.session_state.chat_jobs.append(submit_chat_query(st.session_state.messages, current_year, current_data, current_data['value'].sum()))
+    # Trimmed after submitting so the new question keeps its full history window
+    trim_window(st.session_state.messages)
+    st.session_state.chat_has_earlier = st.session_state.chat_has_earlier or st.session_state.messages[0]["turn"] > 1
 
 # Chat Interface - Only on Dashboard
 if page == "📊 Dashboard":
+    render.start("chat")
     st.subheader("💬 AI Emissions Assistant")
     st.caption("Ask questions about the data or search for latest climate information")
 
-    # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    def load_earlier_messages():
+        earlier, st.session_state.chat_has_earlier = get_chat_store().page(st.session_state.chat_session_id, st.session_state.messages[0]["turn"])
+        st.session_state.messages[:0] = earlier
+
+    @timed("app.chat_area")
+    def chat_area():
+        """Chat history plus pending replies; reruns on its own while replies stream in."""
+        jobs = st.session_state.chat_jobs
+        finished = [job for job in jobs if job.done()]
+        for job in finished:
+            reply = get_chat_store().add_reply(st.session_state.chat_session_id, job.question["turn"], job.reply())
+            place_reply(st.session_state.messages, job.question, reply)
+        st.session_state.chat_jobs = [job for job in jobs if not job.done()]
+        if finished and not st.session_state.chat_jobs:
+            # Full rerun so the fragment is registered again without polling
+            st.rerun()
+
+        if st.session_state.chat_has_earlier:
+            st.button("⬆️ Load earlier messages", key="chat_load_earlier", on_click=load_earlier_messages)
+
+        pending = {id(job.question): job for job in st.session_state.chat_jobs}
+        for message in st.session_state.messages:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+            job = pending.get(id(message))
+            if job is not None:
+                with st.chat_message("assistant"):
+                    st.markdown(f"{job.text} ▌" if job.parts else "_Thinking..._")
+                    st.button("✖ Cancel", key=f"cancel_{job.id}", on_click=job.cancel)
+
+    # Only poll while replies are pending, so idle sessions cost nothing
+    st.fragment(run_every=CHAT_POLL_SECONDS if st.session_state.chat_jobs else None)(chat_area)()
 
     # Chat input
     if prompt := st.chat_input("Ask about emissions data or search the web..."):
-        # Get current data
-        current_year = st.session_state.selected_year
-        current_data = get_sector_data(current_year)
-        total = current_data['value'].sum()
-        
-        # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-        
-        # Generate response
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = process_chat_query(st.session_state.messages, current_year, current_data, total)
-                st.markdown(response)
-        
-        # Add assistant message
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        submit_question(prompt)
+        st.rerun()
 
 # Sidebar with quick actions
+render.start("sidebar")
 with st.sidebar:
     st.header("Quick Questions")
     
@@ -292,16 +545,8 @@ with st.sidebar:
     if page == "📊 Dashboard":
         col1, col2 = st.columns(2)
         
-        # Get current data safely
-        current_year = st.session_state.selected_year
-        current_data = get_sector_data(current_year)
-        total = current_data['value'].sum()
-        
         def handle_quick_question(prompt_text):
-            st.session_state.messages.append({"role": "user", "content": prompt_text})
-            with st.spinner("Thinking..."):
-                response = process_chat_query(st.session_state.messages, current_year, current_data, total)
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            submit_question(prompt_text)
             st.rerun()
 
         with col1:
@@ -325,7 +570,12 @@ with st.sidebar:
     st.caption(f"📅 Currently viewing: {st.session_state.selected_year}")
     
     if st.button("🗑️ Clear Chat History", use_container_width=True):
+        for job in st.session_state.chat_jobs:
+            job.cancel()
+        st.session_state.chat_jobs = []
+        get_chat_store().clear(st.session_state.chat_session_id)
         st.session_state.messages = []
+        st.session_state.chat_has_earlier = False
         st.rerun()
     
     st.divider()
@@ -346,3 +596,12 @@ with st.sidebar:
         **Data Sources:**
         Global emissions data compiled from various international agencies and research institutions.
         """)
+
+render.stop()
+rerun_timer.stop()
+STARTUP.mark("first_paint", script_started)
+if 'first_paint_recorded' not in st.session_state:
+    st.session_state.first_paint_recorded = True
+    METRICS.observe("app.session_first_paint", time.perf_counter() - script_started)
+# Caches the first paint did not need are primed once the page is out, ready for the next interactions
+warm_up()
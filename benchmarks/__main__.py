@@ -0,0 +1,73 @@
+"""Run the benchmark suite against a synthetic database and write the results as JSON.
+
+    python -m benchmarks --years 100 --sectors 500 --regions 200 --out results.json
+    python -m benchmarks --compare baseline.json --out results.json
+
+Everything runs in a temporary directory; the repository database is not touched.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import compare, metadata, quiet_streamlit, write_results
+
+# Before the modules below register their caches, which logs bare-mode warnings
+quiet_streamlit()
+
+import database
+from benchmarks import bench_app, bench_database, bench_query_engine, bench_startup
+from benchmarks.synthetic import seed_database
+
+SUITES = ("database", "query_engine", "app", "startup")
+# Each startup sample is a fresh interpreter, so it gets fewer repeats
+STARTUP_REPEAT = 3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Emissions dashboard benchmarks")
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--sectors", type=int, default=500)
+    parser.add_argument("--regions", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per measurement")
+    parser.add_argument("--storm-seconds", type=float, default=3.0)
+    parser.add_argument("--only", choices=SUITES, action="append", help="run only these suites (repeatable)")
+    parser.add_argument("--out", type=Path, help="write the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="report p50/p95 changes of more than 20%% against this JSON file")
+    args = parser.parse_args()
+    if args.years < 5:
+        parser.error("--years must be at least 5 so the dashboard's 2021-2025 selector has data")
+
+    suites = args.only or SUITES
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / "emissions_data.db"
+        started = time.perf_counter()
+        scale = seed_database(args.years, args.sectors, args.regions)
+        scale["seed_seconds"] = time.perf_counter() - started
+        print(f"Seeded {scale['sector_rows']:,} sector rows and {args.regions} regions in {scale['seed_seconds']:.1f}s", file=sys.stderr)
+
+        if "database" in suites:
+            results["database"] = bench_database.run(args.repeat, storm_seconds=args.storm_seconds)
+        if "query_engine" in suites:
+            results["query_engine"] = bench_query_engine.run(args.repeat)
+        if "app" in suites:
+            results["app"] = bench_app.run(args.repeat)
+        if "startup" in suites:
+            results["startup"] = bench_startup.run(Path(tmp), min(args.repeat, STARTUP_REPEAT))
+
+    report = {"meta": {**metadata(), "scale": scale, "repeat": args.repeat}, "results": results}
+    if args.out:
+        write_results(args.out, report)
+        print(f"Wrote {args.out}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    if args.compare:
+        changes = compare(json.loads(args.compare.read_text()), report)
+        print("\n".join(changes) if changes else "No p50/p95 changes beyond 20%", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
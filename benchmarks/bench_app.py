@@ -0,0 +1,54 @@
+"""Full app.py reruns through AppTest, per page, selected year and comparison selection."""
+from itertools import cycle
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+from streamlit.testing.v1 import AppTest
+
+import chat_jobs
+from benchmarks.common import summarize, timed
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+STUB_REPLY = "Stubbed reply."
+
+
+def stub_chat() -> None:
+    """Answer chat questions instantly so reruns measure the app, not the LLM."""
+    chat_jobs.stream_chat_query = lambda *args, **kwargs: iter([STUB_REPLY])
+
+
+def _run(at: AppTest) -> None:
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+
+def run(repeat: int = 10, years: Iterable[str] = ("2025", "2021")) -> Dict[str, Any]:
+    stub_chat()
+    at = AppTest.from_file(str(APP_PATH), default_timeout=120)
+    results: Dict[str, Any] = {"first_run": summarize(timed(lambda: _run(at), 1))}
+
+    dashboard = results["dashboard"] = {}
+    for year in years:
+        at.selectbox(key="year_selector").set_value(year)
+        dashboard[year] = {"first": summarize(timed(lambda: _run(at), 1)), "rerun": summarize(timed(lambda: _run(at), repeat))}
+
+    # Each selection is a new figure, but all of them slice the same cached pivot
+    at.toggle(key="compare_mode").set_value(True)
+    _run(at)
+    selections = cycle([[2021, 2025], [2023, 2024, 2025], [2021, 2022, 2023, 2024, 2025], [2022]])
+    def switch() -> None:
+        at.multiselect(key="compare_years").set_value(next(selections))
+        _run(at)
+    results["compare_switch"] = summarize(timed(switch, repeat))
+    at.toggle(key="compare_mode").set_value(False)
+
+    def ask() -> None:
+        at.chat_input[0].set_value("Which sector emits the most?")
+        _run(at)
+    results["chat_submit"] = summarize(timed(ask, repeat))
+
+    at.sidebar.radio[0].set_value("🔧 Admin Panel")
+    at.session_state.admin_authenticated = True
+    results["admin"] = {"first": summarize(timed(lambda: _run(at), 1)), "rerun": summarize(timed(lambda: _run(at), repeat))}
+    return results
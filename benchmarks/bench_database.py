@@ -0,0 +1,140 @@
+"""Getter latency with cold and warm caches, write helpers and invalidation storms."""
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import streamlit as st
+
+import database
+from benchmarks.common import summarize, timed
+
+
+def _getters(year: int, sector: str) -> Dict[str, Callable[[], Any]]:
+    return {
+        "get_sector_data": lambda: database.get_sector_data(str(year)),
+        "get_all_sector_data": database.get_all_sector_data,
+        "get_year_summary": lambda: database.get_year_summary(year),
+        "get_yearly_totals": database.get_yearly_totals,
+        "get_regional_data": lambda: database.get_regional_data(year),
+        "get_regional_series_years": lambda: database.get_regional_series(year - 9, year),
+        "get_regional_series_months": lambda: database.get_regional_series(f"{year}-01", f"{year}-12", level="month"),
+        "get_sector_page": database.get_sector_page,
+        "get_sector_page_filtered": lambda: database.get_sector_page(year=year, sector=sector, min_value=0),
+        "get_sector_filter_options": database.get_sector_filter_options,
+        "get_database_info": database.get_database_info,
+    }
+
+
+def bench_getters(repeat: int, cold_repeat: int) -> Dict[str, Any]:
+    """Cold timings clear st.cache_data before every call, so each one hits SQLite.
+
+    Getters served from the snapshot stay warm across that; their reload cost
+    shows up as db.snapshot_refresh during the invalidation storm.
+    """
+    options = database.get_sector_filter_options()
+    getters = _getters(max(options["years"]), options["sectors"][0])
+    results = {}
+    for name, getter in getters.items():
+        results[name] = {
+            "cold": summarize(timed(getter, cold_repeat, before=st.cache_data.clear)),
+            "warm": summarize(timed(getter, repeat)),
+        }
+    return results
+
+
+def _sample_rows(count: int) -> List[Any]:
+    page = database.get_sector_page(limit=count)
+    return list(page.rows.itertuples(index=False))
+
+
+def bench_writes(repeat: int) -> Dict[str, Any]:
+    """Single writes are timed until their future resolves, flush interval included; a burst shares transactions."""
+    rows = _sample_rows(repeat)
+    year = int(database.get_sector_filter_options()["years"][-1])
+    regions = database.get_regional_data(year)
+    updates = iter(rows * (repeat // max(len(rows), 1) + 1))
+
+    def update_sector() -> None:
+        row = next(updates)
+        database.update_sector_emission(row.id, row.year, row.sector, row.value + 1, row.change, row.subsectors).result()
+
+    names = iter(f"Bench Sector {i:05d}" for i in range(repeat))
+    add_samples = timed(lambda: database.add_sector_emission(year, next(names), 100, 0.0, "Benchmark").result(), repeat)
+    with database.get_pool().reader() as conn:
+        added_ids = iter([row[0] for row in conn.execute(
+            "SELECT id FROM sector_emission_rows WHERE sector LIKE 'Bench Sector %' ORDER BY id")])
+    region_rows = iter(list(regions.itertuples(index=False)) * (repeat // max(len(regions), 1) + 1))
+
+    def update_region() -> None:
+        region = next(region_rows)
+        database.update_regional_data(region.id, region.region, int(region.value) + 1, region.color, year).result()
+
+    def burst() -> None:
+        futures = [database.update_sector_emission(row.id, row.year, row.sector, row.value + 2, row.change, row.subsectors)
+                   for row in rows]
+        for future in futures:
+            future.result()
+
+    return {
+        "update_sector_emission": summarize(timed(update_sector, repeat)),
+        f"update_sector_emission_burst_{len(rows)}": summarize(timed(burst, 3)),
+        "add_sector_emission": summarize(add_samples),
+        "delete_sector_emission": summarize(timed(lambda: database.delete_sector_emission(next(added_ids)).result(), repeat)),
+        "update_regional_data": summarize(timed(update_region, repeat)),
+    }
+
+
+def bench_invalidation_storm(seconds: float, writers: int, readers: int, seed: int = 0) -> Dict[str, Any]:
+    """Readers hammer the cached getters while writers keep bumping data versions."""
+    rows = _sample_rows(200)
+    years = sorted({row.year for row in rows})
+    stop = threading.Event()
+    lock = threading.Lock()
+    read_samples: List[float] = []
+    writes = [0]
+
+    def writer(worker: int) -> None:
+        rng = random.Random(seed + worker)
+        while not stop.is_set():
+            row = rng.choice(rows)
+            database.update_sector_emission(row.id, row.year, row.sector, row.value + rng.randint(0, 9), row.change, row.subsectors).result()
+            with lock:
+                writes[0] += 1
+
+    def reader(worker: int) -> None:
+        rng = random.Random(seed + 1000 + worker)
+        local = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            database.get_sector_data(str(rng.choice(years)))
+            database.get_yearly_totals()
+            local.append(time.perf_counter() - started)
+        with lock:
+            read_samples.extend(local)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        "seconds": seconds, "writers": writers, "readers": readers,
+        "writes_per_second": writes[0] / seconds,
+        "reads_per_second": len(read_samples) / seconds,
+        "read": summarize(read_samples),
+        "pool": database.get_pool_stats(),
+        "write_queue": database.get_write_stats(),
+        "snapshot": database.get_snapshot_stats(),
+    }
+
+
+def run(repeat: int = 50, cold_repeat: int = 5, storm_seconds: float = 3.0) -> Dict[str, Any]:
+    return {
+        "getters": bench_getters(repeat, cold_repeat),
+        "writes": bench_writes(repeat),
+        "invalidation_storm": bench_invalidation_storm(storm_seconds, writers=2, readers=8),
+    }
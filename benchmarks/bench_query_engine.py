@@ -0,0 +1,119 @@
+"""Latency and coverage of the local query engine over a corpus of sample questions.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_query_engine [--repeat 200] [--json]
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import database
+from benchmarks.common import percentile, quiet_streamlit
+
+# (question, expected intent); None means the question should go to the LLM
+CORPUS: List[Tuple[str, Optional[str]]] = [
+    ("Which sector emits the most?", "largest"),
+    ("What is the biggest source of emissions in 2023?", "largest"),
+    ("Which sector has the lowest emissions?", "smallest"),
+    ("Show me the emissions trend", "trend"),
+    ("How have transport emissions developed over time?", "trend"),
+    ("Tell me about regional emissions", "regional"),
+    ("Rank the regions by emissions", "regional"),
+    ("What share of emissions comes from agriculture?", "share"),
+    ("Give me a breakdown by sector", "share"),
+    ("What percent is industry in 2022?", "share"),
+    ("How much did energy emissions change from last year?", "yoy"),
+    ("Year over year change in total emissions", "yoy"),
+    ("Which sector is growing fastest?", "fastest_growing"),
+    ("Which sector declined the most in 2024?", "fastest_declining"),
+    ("What's the total for 2023?", "total"),
+    ("How much was emitted overall?", "total"),
+    ("What about waste?", "sector"),
+    ("Tell me about buildings", "sector"),
+    ("Transport emissions in 2024", "sector"),
+    ("Agriculture?", "sector"),
+    ("What's the latest climate news?", None),
+    ("Why did emissions rise in 2022?", None),
+    ("What policies could reduce transport emissions?", None),
+    ("Explain the difference between scope 1 and scope 2", None),
+    ("Are we on track for net-zero?", None),
+    ("hello", None),
+    # Everyday words that the data intents use; without a data subject they go to the LLM
+    ("What is the main greenhouse gas?", None),
+    ("What are the top 3 ways governments can help?", None),
+    ("What are the most important steps to cut emissions?", None),
+    ("How can I reduce my total carbon footprint?", None),
+    ("Has climate change got worse globally?", None),
+    # Questions about a sector that its figures don't answer
+    ("What can be done to reduce transport emissions?", None),
+    ("How can agriculture cut methane?", None),
+    ("What are the health effects of waste incineration?", None),
+    ("How do buildings emissions compare with Europe's?", None),
+    ("Is shipping moving to cleaner fuels?", None),
+]
+
+
+def run(repeat: int, year: str = "2025") -> Dict[str, Any]:
+    from query_engine import answer_locally, get_aggregates, match_intent
+
+    started = time.perf_counter()
+    aggregates = get_aggregates()
+    cold_seconds = time.perf_counter() - started
+
+    latencies: List[float] = []
+    correct = answered = 0
+    misclassified = []
+    for question, expected in CORPUS:
+        match = match_intent(question, aggregates.sector_terms, aggregates.regional.index)
+        intent = match.intent if match else None
+        correct += intent == expected
+        if intent != expected:
+            misclassified.append({"question": question, "expected": expected, "got": intent})
+        for _ in range(repeat):
+            started = time.perf_counter()
+            answer = answer_locally(question, year)
+            latencies.append(time.perf_counter() - started)
+        answered += answer is not None
+
+    return {
+        "questions": len(CORPUS),
+        "answered_locally": answered,
+        "coverage": answered / len(CORPUS),
+        "intent_accuracy": correct / len(CORPUS),
+        "aggregates_build_ms": cold_seconds * 1000,
+        "answer_p50_ms": percentile(latencies, 0.5) * 1000,
+        "answer_p95_ms": percentile(latencies, 0.95) * 1000,
+        "answer_max_ms": max(latencies) * 1000,
+        "misclassified": misclassified,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="timed answers per question")
+    parser.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    args = parser.parse_args()
+
+    quiet_streamlit()
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = Path(tmp) / "bench.db"
+        database.init_database()
+        result = run(args.repeat)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"Coverage:        {result['answered_locally']}/{result['questions']} answered locally ({result['coverage']:.0%})")
+    print(f"Intent accuracy: {result['intent_accuracy']:.0%}")
+    print(f"Aggregates:      {result['aggregates_build_ms']:.1f} ms to build (once per data version)")
+    print(f"Answer latency:  p50 {result['answer_p50_ms']:.3f} ms, p95 {result['answer_p95_ms']:.3f} ms, max {result['answer_max_ms']:.3f} ms")
+    for miss in result["misclassified"]:
+        print(f"  misclassified: {miss['question']!r} expected {miss['expected']} got {miss['got']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Cold start in fresh interpreters: import times of the heavy modules and the first app.py run."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.common import summarize
+from instrumentation import LAZY_MODULES
+
+ROOT = Path(__file__).resolve().parent.parent
+# What app.py imports itself, timed with streamlit and pandas already loaded
+APP_MODULES = "instrumentation, database, charts, chat_jobs, chat_store, derived_metrics, exports, ai_assistant, response_cache"
+IMPORTS = {
+    "streamlit": ("", "streamlit"),
+    "pandas": ("", "pandas"),
+    "plotly_express": ("", "plotly.express"),
+    "anthropic": ("", "anthropic"),
+    "app_modules": ("streamlit, pandas", APP_MODULES),
+}
+
+IMPORT_PROBE = """
+import json, sys, time
+{preload}
+started = time.perf_counter()
+import {modules}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": {{name: name in sys.modules for name in {lazy!r}}}}}))
+"""
+
+FIRST_PAINT_PROBE = """
+import json, time
+import streamlit.logger
+streamlit.logger.set_log_level("error")
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+started = time.perf_counter()
+at.run()
+seconds = time.perf_counter() - started
+from instrumentation import STARTUP
+phases = STARTUP.table()
+print(json.dumps({{"seconds": seconds, "ok": not at.exception, "phases": dict(zip(phases["phase"], phases["ms"])),
+                  "loaded": STARTUP.lazy_modules()}}))
+"""
+
+
+def _probe(code: str, cwd: Path) -> Dict[str, Any]:
+    """Run `code` in a new interpreter with the repository importable; it prints one JSON line."""
+    env_path = f"import sys; sys.path.insert(0, {str(ROOT)!r})\n"
+    result = subprocess.run([sys.executable, "-c", env_path + code], cwd=cwd, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(db_dir: Path, repeat: int = 3) -> Dict[str, Any]:
+    """`db_dir` holds the emissions_data.db the first run opens, as the app resolves it relative to the cwd."""
+    results: Dict[str, Any] = {"imports": {}}
+    for name, (preload, modules) in IMPORTS.items():
+        code = IMPORT_PROBE.format(preload=f"import {preload}" if preload else "", modules=modules, lazy=LAZY_MODULES)
+        probes = [_probe(code, db_dir) for _ in range(repeat)]
+        results["imports"][name] = summarize([probe["seconds"] for probe in probes])
+        if name == "app_modules":
+            results["app_modules_load"] = probes[-1]["loaded"]
+
+    paints: List[Dict[str, Any]] = [_probe(FIRST_PAINT_PROBE.format(app=str(ROOT / "app.py")), db_dir) for _ in range(repeat)]
+    if not all(paint["ok"] for paint in paints):
+        raise RuntimeError("app.py raised during its first run")
+    results["first_run"] = summarize([paint["seconds"] for paint in paints])
+    results["phases"] = {phase: summarize([paint["phases"][phase] / 1000 for paint in paints if phase in paint["phases"]])
+                         for phase in paints[-1]["phases"]}
+    results["first_run_loads"] = paints[-1]["loaded"]
+    return results
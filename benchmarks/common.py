@@ -0,0 +1,90 @@
+"""Timing, metadata and JSON helpers shared by the benchmarks."""
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import streamlit
+import streamlit.logger
+
+
+def quiet_streamlit() -> None:
+    """Silence the bare-mode ScriptRunContext/cache warnings Streamlit logs outside `streamlit run`."""
+    streamlit.logger.set_log_level("error")
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Sample count and mean/p50/p95/max in milliseconds."""
+    if not samples:
+        return {"n": 0}
+    return {
+        "n": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def timed(call: Callable[[], Any], repeat: int, before: Callable[[], Any] = lambda: None) -> List[float]:
+    """Wall-clock seconds of `repeat` calls; `before` runs untimed ahead of each one."""
+    samples = []
+    for _ in range(repeat):
+        before()
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def metadata() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "streamlit": streamlit.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def write_results(path: Path, results: Dict[str, Any]) -> None:
+    path.write_text(json.dumps(results, indent=2, sort_keys=True))
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.2) -> List[str]:
+    """Lines for every p50/p95 timing that moved by more than `threshold` against the baseline."""
+    old, new = _flatten(baseline.get("results", {})), _flatten(current.get("results", {}))
+    lines = []
+    for name in sorted(old.keys() & new.keys()):
+        if not name.endswith(("p50_ms", "p95_ms")) or not old[name]:
+            continue
+        ratio = new[name] / old[name]
+        if abs(ratio - 1) > threshold:
+            label = "slower" if ratio > 1 else "faster"
+            lines.append(f"{name}: {old[name]:.2f} -> {new[name]:.2f} ms ({ratio:.2f}x, {label})")
+    return lines
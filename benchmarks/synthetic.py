@@ -0,0 +1,78 @@
+"""Synthetic emissions data at configurable scale."""
+import io
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+import database
+
+# The real sector names come first so the query engine corpus still resolves sectors
+REAL_SECTORS = ["Energy Production", "Industrial Process", "Transportation", "Agriculture", "Buildings", "Waste"]
+LAST_YEAR = 2025
+
+
+def sector_names(count: int) -> list:
+    return (REAL_SECTORS + [f"Sector {i:04d}" for i in range(len(REAL_SECTORS) + 1, count + 1)])[:count]
+
+
+def generate_sectors(years: int, sectors: int, seed: int = 0) -> pd.DataFrame:
+    """One row per (year, sector) ending in 2025; values follow a per-sector random walk."""
+    rng = np.random.default_rng(seed)
+    base = rng.lognormal(mean=7.0, sigma=1.2, size=sectors)
+    growth = rng.normal(0.01, 0.04, size=(years, sectors))
+    growth[0] = 0.0
+    values = np.round(base * np.cumprod(1 + growth, axis=0))
+    change = np.vstack([np.zeros(sectors), (values[1:] / np.maximum(values[:-1], 1) - 1) * 100]).round(1)
+    names = sector_names(sectors)
+    return pd.DataFrame({
+        "year": np.repeat(np.arange(LAST_YEAR - years + 1, LAST_YEAR + 1), sectors),
+        "sector": np.tile(names, years),
+        "value": values.ravel().astype(int),
+        "change": change.ravel(),
+        "subsectors": np.tile([f"{name} subsectors" for name in names], years),
+    })
+
+
+def generate_regions(regions: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed + 1)
+    return pd.DataFrame({
+        "region": [f"Region {i:04d}" for i in range(1, regions + 1)],
+        "value": rng.integers(100, 20000, size=regions),
+        "color": [f"#{c:06x}" for c in rng.integers(0, 0xFFFFFF, size=regions)],
+    })
+
+
+def generate_regional_facts(years: int, regions: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Unattributed monthly facts: each region's value split evenly over months, drifting by year."""
+    rng = np.random.default_rng(seed + 2)
+    drift = np.cumprod(1 + rng.normal(0.01, 0.03, size=(years, len(regions))), axis=0)
+    monthly = drift[:, :, None] * regions["value"].to_numpy()[None, :, None] / 12 * np.ones(12)
+    return pd.DataFrame({
+        "year": np.repeat(np.arange(LAST_YEAR - years + 1, LAST_YEAR + 1), len(regions) * 12),
+        "month": np.tile(np.arange(1, 13), years * len(regions)),
+        "region": np.tile(np.repeat(regions["region"].to_numpy(), 12), years),
+        "sector": None,
+        "value": monthly.ravel().round(2),
+    })
+
+
+def seed_database(years: int = 100, sectors: int = 500, regions: int = 200, seed: int = 0) -> Dict[str, int]:
+    """Replace the demo rows in the current database.DB_PATH with synthetic data.
+
+    sector_emissions goes through import_sector_csv and regional facts through
+    upsert_regional_facts, so yearly_totals and the regional rollups are derived
+    exactly as in production.
+    """
+    database.init_database()
+    region_rows = generate_regions(regions, seed)
+    with database.get_pool().writer() as conn:
+        conn.execute("DELETE FROM sector_emissions")
+        conn.execute("DELETE FROM regional_facts")
+        conn.execute("DELETE FROM regions")
+        conn.executemany("INSERT INTO regions (name, color) VALUES (?, ?)", region_rows[["region", "color"]].itertuples(index=False, name=None))
+    buffer = io.BytesIO(generate_sectors(years, sectors, seed).to_csv(index=False).encode())
+    report = database.import_sector_csv(buffer)
+    # Both loaders bump the versions they touch themselves
+    facts = database.upsert_regional_facts(generate_regional_facts(years, region_rows, seed).itertuples(index=False, name=None))
+    return {"years": years, "sectors": sectors, "regions": regions, "sector_rows": report.rows_imported, "regional_facts": facts}
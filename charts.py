@@ -0,0 +1,97 @@
+import streamlit as st
+from typing import TYPE_CHECKING, Iterable, Tuple
+from database import get_data_version, get_regional_data, get_regional_series, get_regional_years, get_sector_data, get_sector_pivot, get_yearly_totals
+
+GRID_COLOR = 'rgba(100,116,139,0.3)'
+TRANSPARENT = 'rgba(0,0,0,0)'
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+
+# Figures are cached as shared resources keyed by the data generation they were
+# built from, so every rerun and session reuses them until an admin edit bumps
+# the version. Callers must treat the returned figures as read-only. Plotly is
+# imported inside the builders so pages without charts never load it.
+
+@st.cache_resource(max_entries=16)
+def _sector_bar(year: str, version: int) -> "go.Figure":
+    import plotly.express as px
+    fig = px.bar(get_sector_data(year), y='sector', x='value', orientation='h', labels={'value': 'Million tonnes CO2e', 'sector': ''}, color_discrete_sequence=['#3b82f6'])
+    fig.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0), plot_bgcolor=TRANSPARENT, paper_bgcolor=TRANSPARENT, font=dict(size=12), showlegend=False)
+    fig.update_xaxes(gridcolor=GRID_COLOR, showgrid=True)
+    fig.update_yaxes(gridcolor=GRID_COLOR, showgrid=False)
+    return fig
+
+@st.cache_resource(max_entries=16)
+def _region_pie(year: int, version: int) -> "go.Figure":
+    import plotly.express as px
+    region_data = get_regional_data(year)
+    fig = px.pie(region_data, values='value', names='region', hole=0.5, color='region', color_discrete_map={region: color for region, color in zip(region_data['region'], region_data['color'])})
+    fig.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0), showlegend=True, legend=dict(orientation="v", yanchor="middle", y=0.5, xanchor="left", x=1), font=dict(size=11), plot_bgcolor=TRANSPARENT, paper_bgcolor=TRANSPARENT)
+    fig.update_traces(textposition='inside', textinfo='percent', textfont_size=11)
+    return fig
+
+@st.cache_resource(max_entries=4)
+def _trend_area(version: int) -> "go.Figure":
+    import plotly.graph_objects as go
+    yearly_data = get_yearly_totals()
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=yearly_data['year'].astype(str), y=yearly_data['total'], mode='lines', fill='tozeroy', line=dict(color='#3b82f6', width=2), fillcolor='rgba(59, 130, 246, 0.1)'))
+    fig.update_layout(height=300, margin=dict(l=0, r=0, t=0, b=0), plot_bgcolor=TRANSPARENT, paper_bgcolor=TRANSPARENT, font=dict(size=12), showlegend=False, xaxis=dict(title='', gridcolor=GRID_COLOR), yaxis=dict(title='Million tonnes CO2e', gridcolor=GRID_COLOR))
+    return fig
+
+@st.cache_resource(max_entries=4)
+def _regional_trend(version: int) -> "go.Figure":
+    import plotly.express as px
+    years = get_regional_years()
+    series = get_regional_series(years[0], years[-1]) if years else get_regional_data().iloc[0:0]
+    fig = px.area(series, x=series['year'].astype(str), y='value', color='region', color_discrete_map={region: color for region, color in zip(series['region'], series['color'])}, labels={'x': '', 'value': 'Million tonnes CO2e', 'region': ''})
+    fig.update_layout(height=300, margin=dict(l=0, r=0, t=0, b=0), plot_bgcolor=TRANSPARENT, paper_bgcolor=TRANSPARENT, font=dict(size=12), legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="left", x=0))
+    fig.update_xaxes(gridcolor=GRID_COLOR)
+    fig.update_yaxes(gridcolor=GRID_COLOR)
+    return fig
+
+@st.cache_resource(max_entries=16)
+def _comparison_bars(years: Tuple[int, ...], version: int) -> "go.Figure":
+    import plotly.express as px
+    data = get_sector_pivot()[list(years)].rename(columns=str).rename_axis("sector").reset_index().melt(id_vars="sector", var_name="year", value_name="value")
+    fig = px.bar(data, x='sector', y='value', color='year', barmode='group', labels={'value': 'Million tonnes CO2e', 'sector': '', 'year': ''}, color_discrete_sequence=px.colors.sequential.Blues[-len(years):])
+    fig.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0), plot_bgcolor=TRANSPARENT, paper_bgcolor=TRANSPARENT, font=dict(size=12), legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="left", x=0))
+    fig.update_xaxes(gridcolor=GRID_COLOR, showgrid=False)
+    fig.update_yaxes(gridcolor=GRID_COLOR, showgrid=True)
+    return fig
+
+@st.cache_resource(max_entries=16)
+def _comparison_heatmap(years: Tuple[int, ...], version: int) -> "go.Figure":
+    import plotly.express as px
+    data = get_sector_pivot()[list(years)].rename(columns=str)
+    fig = px.imshow(data, text_auto=',.0f', aspect='auto', color_continuous_scale='Blues', labels={'x': '', 'y': '', 'color': 'Mt CO2e'})
+    fig.update_layout(height=350, margin=dict(l=0, r=0, t=0, b=0), plot_bgcolor=TRANSPARENT, paper_bgcolor=TRANSPARENT, font=dict(size=12))
+    fig.update_xaxes(side='top', type='category')
+    return fig
+
+
+def sector_bar_figure(year: str) -> "go.Figure":
+    """Horizontal bar of one year's sector emissions."""
+    return _sector_bar(str(year), get_data_version("sector_emissions", year))
+
+def region_pie_figure(year: str) -> "go.Figure":
+    """Donut of one year's emissions by region in each region's own color."""
+    return _region_pie(int(year), get_data_version("regional_data", int(year)))
+
+def trend_area_figure() -> "go.Figure":
+    """Filled line of total emissions per year."""
+    return _trend_area(get_data_version("yearly_totals"))
+
+def regional_trend_figure() -> "go.Figure":
+    """Stacked area of emissions per region across all years, read from the yearly rollup."""
+    return _regional_trend(get_data_version("regional_data"))
+
+def comparison_bars_figure(years: Iterable[int]) -> "go.Figure":
+    """Grouped bars of each sector's emissions in the chosen years, sliced from the sector x year pivot."""
+    return _comparison_bars(tuple(sorted(int(year) for year in years)), get_data_version("sector_emissions"))
+
+def comparison_heatmap_figure(years: Iterable[int]) -> "go.Figure":
+    """Sector x year heatmap of emissions for the chosen years."""
+    return _comparison_heatmap(tuple(sorted(int(year) for year in years)), get_data_version("sector_emissions"))
@@ -0,0 +1,94 @@
+import threading
+import uuid
+import streamlit as st
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+from ai_assistant import stream_chat_query
+from instrumentation import timed
+
+# Workers beyond the gateway's concurrency cap simply queue on its semaphore
+CHAT_WORKERS = 16
+CHAT_POLL_SECONDS = 0.5
+CANCELLED_NOTE = "*(Cancelled)*"
+
+
+@st.cache_resource
+def get_chat_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by all sessions for assistant replies."""
+    return ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat")
+
+
+class ChatJob:
+    """An assistant reply produced in the background for one user message.
+
+    Chunks are appended as they stream in, so the UI can show partial text
+    while the job runs. Cancelling stops the stream at the next chunk.
+    """
+
+    def __init__(self, question: Dict[str, str], chunks: Iterator[str]) -> None:
+        self.id = uuid.uuid4().hex
+        self.question = question
+        self.parts: List[str] = []
+        self._cancelled = threading.Event()
+        self._chunks = chunks
+        self.future: Optional[Future] = None
+
+    @timed("chat.background_reply")
+    def _run(self) -> None:
+        try:
+            for chunk in self._chunks:
+                if self._cancelled.is_set():
+                    break
+                self.parts.append(chunk)
+        finally:
+            # Closing the generator ends the API stream and frees its gateway slot
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def reply(self) -> str:
+        """Final assistant message; only meaningful once the job is done."""
+        if self.future.cancelled():
+            return CANCELLED_NOTE
+        error = self.future.exception()
+        if error is not None:
+            return f"An unexpected error occurred: {error}"
+        if self.cancelled:
+            return f"{self.text}\n\n{CANCELLED_NOTE}" if self.parts else CANCELLED_NOTE
+        return self.text
+
+
+def submit_chat_query(messages: List[Dict[str, str]], current_year: str, current_data: Any, total_emissions: float) -> ChatJob:
+    """Answer the latest message in the background.
+
+    The request is prepared on the calling script thread; only the API stream
+    runs on the executor.
+    """
+    job = ChatJob(messages[-1], stream_chat_query(messages, current_year, current_data, total_emissions))
+    job.future = get_chat_executor().submit(job._run)
+    return job
+
+
+def place_reply(messages: List[Dict[str, Any]], question: Dict[str, Any], reply: Dict[str, Any]) -> None:
+    """Insert a reply right after its question, whatever order jobs finish in."""
+    index = next((i for i, message in enumerate(messages) if message is question), None)
+    if index is None:
+        # The question has left the window (or the conversation was cleared)
+        return
+    messages.insert(index + 1, reply)
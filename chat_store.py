@@ -0,0 +1,95 @@
+import hashlib
+import time
+import uuid
+import streamlit as st
+from typing import Dict, List, Tuple
+from database import ConnectionPool, get_pool
+
+# Turns (a question and its reply) kept in st.session_state and loaded per "load earlier" click
+CHAT_WINDOW_TURNS = 20
+CHAT_PAGE_TURNS = 20
+CHAT_RETENTION_SECONDS = 30 * 24 * 60 * 60
+
+Message = Dict[str, object]
+
+
+class ChatStore:
+    """Chat history in SQLite, one conversation per session id, read in pages of turns."""
+
+    def __init__(self, pool: ConnectionPool) -> None:
+        self.pool = pool
+
+    def add_question(self, session_id: str, content: str) -> Message:
+        """Store a user message as the session's next turn and return it as a window entry."""
+        with self.pool.writer() as conn:
+            turn = conn.execute("SELECT COALESCE(MAX(turn), 0) + 1 FROM chat_messages WHERE session_id = ?",
+                                (session_id,)).fetchone()[0]
+            conn.execute("INSERT INTO chat_messages (session_id, turn, role, content, created_at) VALUES (?, ?, 'user', ?, ?)",
+                         (session_id, turn, content, time.time()))
+        return {"role": "user", "content": content, "turn": turn}
+
+    def add_reply(self, session_id: str, turn: int, content: str) -> Message:
+        with self.pool.writer() as conn:
+            conn.execute("""
+                INSERT INTO chat_messages (session_id, turn, role, content, created_at) VALUES (?, ?, 'assistant', ?, ?)
+                ON CONFLICT (session_id, turn, role) DO UPDATE SET content = excluded.content
+            """, (session_id, turn, content, time.time()))
+        return {"role": "assistant", "content": content, "turn": turn}
+
+    def page(self, session_id: str, before_turn: int = 2 ** 62, turns: int = CHAT_PAGE_TURNS) -> Tuple[List[Message], bool]:
+        """Messages of the `turns` latest turns before `before_turn`, oldest first, and whether more exist."""
+        with self.pool.reader() as conn:
+            rows = conn.execute("""
+                SELECT turn, role, content FROM chat_messages
+                WHERE session_id = ? AND turn IN (
+                    SELECT turn FROM chat_messages WHERE session_id = ? AND turn < ? AND role = 'user'
+                    ORDER BY turn DESC LIMIT ?
+                )
+                ORDER BY turn, role = 'assistant'
+            """, (session_id, session_id, before_turn, turns + 1)).fetchall()
+        # One extra turn was fetched only to tell whether there is an earlier page
+        has_earlier = len({turn for turn, _, _ in rows}) > turns
+        if has_earlier:
+            oldest = rows[0][0]
+            rows = [row for row in rows if row[0] != oldest]
+        return [{"role": role, "content": content, "turn": turn} for turn, role, content in rows], has_earlier
+
+    def clear(self, session_id: str) -> None:
+        with self.pool.writer() as conn:
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+
+    def prune(self, max_age_seconds: float = CHAT_RETENTION_SECONDS) -> int:
+        """Drop messages older than the retention period; returns the number removed."""
+        with self.pool.writer() as conn:
+            return conn.execute("DELETE FROM chat_messages WHERE created_at < ?", (time.time() - max_age_seconds,)).rowcount
+
+
+@st.cache_resource
+def _get_chat_store(db_path: str, _pool: ConnectionPool) -> ChatStore:
+    store = ChatStore(_pool)
+    store.prune()
+    return store
+
+def get_chat_store() -> ChatStore:
+    """Process-wide chat store on the current database."""
+    pool = get_pool()
+    return _get_chat_store(str(pool.db_path), pool)
+
+
+def get_session_id() -> str:
+    """Conversation id for this browser session; it is never put in the URL, where it would act as a password.
+
+    With st.login configured, signed-in users resume their history after a
+    reload, keyed on their identity. Otherwise each page load starts a new
+    conversation.
+    """
+    if st.user.get("is_logged_in"):
+        identity = f"{st.user.get('iss', '')}|{st.user.get('sub') or st.user.get('email')}"
+        return "user-" + hashlib.sha256(identity.encode()).hexdigest()[:32]
+    return uuid.uuid4().hex
+
+def trim_window(messages: List[Message], turns: int = CHAT_WINDOW_TURNS) -> None:
+    """Drop all but the latest `turns` turns from a session-state window, in place."""
+    kept_turns = sorted({message["turn"] for message in messages})[-turns:]
+    if kept_turns:
+        messages[:] = [message for message in messages if message["turn"] >= kept_turns[0]]
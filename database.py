@@ -1,48 +1,382 @@
+import atexit
+import json
+import math
+import queue
 import sqlite3
+import threading
+import time
 import pandas as pd
 import streamlit as st
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from instrumentation import METRICS, cache_miss, timed
+from migrations import REBUILD_YEARLY_TOTALS_SQL, REGIONAL_ROLLUPS, rebuild_rollup_sql, run_migrations
+from snapshot import Snapshot, SnapshotStore
 
 DB_PATH = Path("emissions_data.db")
 
+# Connection tuning shared by every pooled connection
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+    "PRAGMA foreign_keys = ON",
+)
+
+# Queued admin writes: the longest one waits for others to share its transaction, and the batch cap
+WRITE_FLUSH_SECONDS = 0.01
+WRITE_BATCH_MAX = 64
+
+# Regional rollup levels, coarsest first, with the months each bucket spans
+REGIONAL_LEVELS = {"year": 12, "quarter": 3, "month": 1}
+# Monthly weights of the demo regional facts: a mild winter peak, summing to 1
+DEMO_SEASONALITY = tuple((1 + 0.1 * math.cos(2 * math.pi * month / 12)) / 12 for month in range(12))
+
+
+class ConnectionPool:
+    """Long-lived SQLite connections: a bounded pool of readers plus a single writer.
+
+    Readers are opened read-only and handed out to any thread; the writer is
+    serialized behind a lock and runs each block in an IMMEDIATE transaction.
+    """
+
+    def __init__(self, db_path: Path, size: int = POOL_SIZE, busy_timeout_ms: int = BUSY_TIMEOUT_MS) -> None:
+        self.db_path = Path(db_path)
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = self._connect(read_only=False)
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "wait_seconds": 0.0, "writes": 0}
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        if read_only:
+            conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True,
+                                   timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000,
+                                   check_same_thread=False, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            self._count("hits")
+            return conn
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                self._stats["misses"] += 1
+                open_new = True
+            else:
+                open_new = False
+        if open_new:
+            try:
+                return self._connect(read_only=True)
+            except sqlite3.Error:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        started = time.perf_counter()
+        conn = self._idle.get()
+        with self._lock:
+            self._stats["waits"] += 1
+            self._stats["wait_seconds"] += time.perf_counter() - started
+        return conn
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection, returning it to the pool afterwards."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Run a block on the writer connection inside a single transaction."""
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+            self._count("writes")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open_readers"] = self._opened
+            stats["idle_readers"] = self._idle.qsize()
+        checkouts = stats["hits"] + stats["misses"] + stats["waits"]
+        stats["hit_ratio"] = stats["hits"] / checkouts if checkouts else 0.0
+        return stats
+
+
+@st.cache_resource
+def _get_pool(db_path: str) -> ConnectionPool:
+    return ConnectionPool(Path(db_path))
+
+def get_pool() -> ConnectionPool:
+    """Process-wide connection pool for the current DB_PATH."""
+    return _get_pool(str(DB_PATH))
+
+def get_pool_stats() -> Dict[str, float]:
+    return get_pool().stats()
+
+def _audit(cursor: sqlite3.Cursor, action: str, detail: Dict[str, Any]) -> None:
+    """Record an admin write in audit_log; call it inside the write's own transaction."""
+    cursor.execute("INSERT INTO audit_log (at, action, detail) VALUES (?, ?, ?)",
+                   (time.time(), action, json.dumps(detail, default=str)))
+
+@dataclass
+class WriteOp:
+    action: str
+    detail: Dict[str, Any]
+    apply: Callable[[sqlite3.Cursor], Any]
+    on_commit: Optional[Callable[[Any], None]]
+    future: Future
+
+class WriteQueue:
+    """A single writer thread that applies queued operations in batched transactions.
+
+    Operations arriving within `flush_seconds` of each other share one
+    transaction. Each runs under its own savepoint together with its audit_log
+    row, so a failing operation is rolled back alone and only its future gets
+    the exception. Futures resolve after COMMIT, once `on_commit` has run.
+    """
+
+    def __init__(self, pool: ConnectionPool, flush_seconds: float = WRITE_FLUSH_SECONDS, max_batch: int = WRITE_BATCH_MAX) -> None:
+        self.pool = pool
+        self.flush_seconds = flush_seconds
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Optional[WriteOp]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"operations": 0, "failed": 0, "transactions": 0, "largest_batch": 0}
+        self._thread = threading.Thread(target=self._run, daemon=True, name="db-writer")
+        self._thread.start()
+
+    def submit(self, action: str, detail: Dict[str, Any], apply: Callable[[sqlite3.Cursor], Any],
+               on_commit: Optional[Callable[[Any], None]] = None) -> Future:
+        """Queue `apply(cursor)`; the future holds its return value once committed.
+
+        Recorded as db.<action>, from submission until the future resolves.
+        """
+        op = WriteOp(action, detail, apply, on_commit, Future())
+        if METRICS.enabled and METRICS.sampled():
+            started = time.perf_counter()
+            op.future.add_done_callback(lambda future: METRICS.observe(
+                f"db.{action}", time.perf_counter() - started, ok=not future.cancelled() and future.exception() is None))
+        self._queue.put(op)
+        return op.future
+
+    def close(self) -> None:
+        """Apply everything already queued, then stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _next_batch(self) -> Tuple[List[WriteOp], bool]:
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.max_batch:
+            try:
+                op = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if op is None:
+                return batch, True
+            batch.append(op)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._apply(batch)
+
+    @timed("db.write_batch")
+    def _apply(self, batch: List[WriteOp]) -> None:
+        # Operations whose futures were cancelled while queued are dropped
+        batch = [op for op in batch if op.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results: List[Tuple[WriteOp, Any]] = []
+        failed = 0
+        try:
+            with self.pool.writer() as conn:
+                cursor = conn.cursor()
+                for op in batch:
+                    cursor.execute("SAVEPOINT write_op")
+                    try:
+                        result = op.apply(cursor)
+                        _audit(cursor, op.action, op.detail)
+                    except Exception as error:
+                        cursor.execute("ROLLBACK TO write_op")
+                        op.future.set_exception(error)
+                        failed += 1
+                    else:
+                        results.append((op, result))
+                    cursor.execute("RELEASE write_op")
+        except Exception as error:
+            for op, _ in results:
+                op.future.set_exception(error)
+            failed += len(results)
+            results = []
+        for op, result in results:
+            try:
+                if op.on_commit is not None:
+                    op.on_commit(result)
+            except Exception as error:
+                op.future.set_exception(error)
+            else:
+                op.future.set_result(result)
+        with self._lock:
+            self._stats["operations"] += len(batch)
+            self._stats["failed"] += failed
+            self._stats["transactions"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["mean_batch"] = stats["operations"] / stats["transactions"] if stats["transactions"] else 0.0
+        return stats
+
+
+@st.cache_resource
+def _get_write_queue(db_path: str, _pool: ConnectionPool) -> WriteQueue:
+    writes = WriteQueue(_pool)
+    atexit.register(writes.close)
+    return writes
+
+def get_write_queue() -> WriteQueue:
+    """Process-wide writer thread for admin edits on the current database."""
+    pool = get_pool()
+    return _get_write_queue(str(pool.db_path), pool)
+
+def get_write_stats() -> Dict[str, float]:
+    return get_write_queue().stats()
+
+class DataVersions:
+    """Generation counters per table, and per key within a table, used as cache keys.
+
+    Bumping a key also bumps the table-wide generation, so whole-table readers
+    refresh while readers of other keys keep their cached frames. A bump with
+    no keys also moves FULL_KEY, telling incremental readers that any key may
+    have changed.
+    """
+
+    FULL_KEY = "*"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._generations: Dict[Tuple[str, Optional[str]], int] = {}
+
+    def get(self, table: str, key: Optional[Any] = None) -> int:
+        if key is None:
+            return self._generations.get((table, None), 0)
+        # A keyless bump changes every key; the sum still only ever grows, so old values never recur
+        return self._generations.get((table, str(key)), 0) + self._generations.get((table, self.FULL_KEY), 0)
+
+    def bump(self, table: str, *keys: Any) -> None:
+        with self._lock:
+            for slot in {(table, None), *((table, str(key)) for key in keys or (self.FULL_KEY,))}:
+                self._generations[slot] = self._generations.get(slot, 0) + 1
+
+    def generations(self, table: str) -> Dict[Optional[str], int]:
+        """Every generation of one table, keyed by key (None for the table-wide one)."""
+        with self._lock:
+            return {key: generation for (name, key), generation in self._generations.items() if name == table}
+
+
+@st.cache_resource
+def get_data_versions() -> DataVersions:
+    return DataVersions()
+
+def get_data_version(table: str, key: Optional[Any] = None) -> int:
+    return get_data_versions().get(table, key)
+
+# Module-level rather than st.cache_resource: get_snapshot() sits on every dashboard
+# read, and a cache_resource lookup costs more than serving the read itself.
+_snapshot_stores: Dict[str, SnapshotStore] = {}
+_snapshot_stores_lock = threading.Lock()
+
+def _get_snapshot_store() -> SnapshotStore:
+    store = _snapshot_stores.get(str(DB_PATH))
+    if store is None:
+        with _snapshot_stores_lock:
+            store = _snapshot_stores.get(str(DB_PATH))
+            if store is None:
+                store = _snapshot_stores[str(DB_PATH)] = SnapshotStore(get_pool().reader, get_data_versions().generations,
+                                                                      DataVersions.FULL_KEY)
+    return store
+
+def get_snapshot() -> Snapshot:
+    """Columnar copy of sector_emissions, yearly_totals and the yearly regional rollup, refreshed on writes."""
+    return _get_snapshot_store().current()
+
+def get_snapshot_stats() -> Dict[str, int]:
+    """Bytes held by the snapshot per table, and how often it has been (re)loaded."""
+    store = _get_snapshot_store()
+    return {**store.current().memory(), "refreshes": store.refreshes}
+
+def _resolve_ids(cursor: sqlite3.Cursor, table: str, column: str, names: Iterable[str]) -> Dict[str, int]:
+    """Map lookup-table names to ids, inserting any that are missing."""
+    names = set(names)
+    cursor.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", ((name,) for name in names))
+    rows = cursor.execute(f"SELECT {column}, id FROM {table}").fetchall()
+    return {name: id for name, id in rows if name in names}
+
+_UPSERT_SECTOR_SQL = """
+    INSERT INTO sector_emissions (year, sector_id, value, change, subsector_id) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (year, sector_id) DO UPDATE SET
+        value = excluded.value, change = excluded.change, subsector_id = excluded.subsector_id
+"""
+
+def _insert_sector_rows(cursor: sqlite3.Cursor, rows: List[Tuple[Any, str, int, float, str]]) -> None:
+    """Upsert (year, sector, value, change, subsectors) rows on the (year, sector) key."""
+    sector_ids = _resolve_ids(cursor, "sectors", "name", (row[1] for row in rows))
+    subsector_ids = _resolve_ids(cursor, "subsectors", "label", (row[4] for row in rows))
+    cursor.executemany(_UPSERT_SECTOR_SQL, ((int(year), sector_ids[sector], value, change, subsector_ids[subsectors])
+                                            for year, sector, value, change, subsectors in rows))
+
 @st.cache_resource
 def init_database() -> None:
     """Initialize SQLite database with emissions data"""
-    with sqlite3.connect(DB_PATH) as conn:
+    pool = get_pool()
+    run_migrations(pool)
+    with pool.writer() as conn:
         cursor = conn.cursor()
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sector_emissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                year TEXT NOT NULL,
-                sector TEXT NOT NULL,
-                value INTEGER NOT NULL,
-                change REAL NOT NULL,
-                subsectors TEXT NOT NULL
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS yearly_totals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                year TEXT NOT NULL UNIQUE,
-                total INTEGER NOT NULL,
-                energy INTEGER NOT NULL,
-                transport INTEGER NOT NULL,
-                industry INTEGER NOT NULL,
-                other INTEGER NOT NULL
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS regional_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                region TEXT NOT NULL UNIQUE,
-                value INTEGER NOT NULL,
-                color TEXT NOT NULL
-            )
-        """)
-
         cursor.execute("SELECT COUNT(*) FROM sector_emissions")
         if cursor.fetchone()[0] == 0:
             sector_data = [
@@ -77,16 +411,7 @@ def init_database() -> None:
                 ('2025', 'Buildings', 3000, -6.3, 'Residential, Commercial'),
                 ('2025', 'Waste', 1500, 7.1, 'Landfills, Wastewater'),
             ]
-            cursor.executemany("INSERT INTO sector_emissions (year, sector, value, change, subsectors) VALUES (?, ?, ?, ?, ?)", sector_data)
-
-            yearly_data = [
-                ('2021', 36400, 13100, 7600, 5600, 10100),
-                ('2022', 37500, 13400, 8000, 5800, 10300),
-                ('2023', 38100, 13500, 8100, 5800, 10700),
-                ('2024', 38900, 13800, 8300, 5900, 10900),
-                ('2025', 39400, 14000, 8500, 6000, 10900),
-            ]
-            cursor.executemany("INSERT INTO yearly_totals (year, total, energy, transport, industry, other) VALUES (?, ?, ?, ?, ?, ?)", yearly_data)
+            _insert_sector_rows(cursor, sector_data)
 
             regional_data = [
                 ('Asia-Pacific', 18500, '#f59e0b'),
@@ -96,60 +421,446 @@ def init_database() -> None:
                 ('Latin America', 2400, '#10b981'),
                 ('Africa', 1500, '#06b6d4'),
             ]
-            cursor.executemany("INSERT INTO regional_data (region, value, color) VALUES (?, ?, ?)", regional_data)
-        conn.commit()
+            cursor.executemany("INSERT INTO regions (name, color) VALUES (?, ?)", [(region, color) for region, _, color in regional_data])
+            # Demo facts: each sector's yearly value split across regions by their share above, then by month
+            regional_total = sum(value for _, value, _ in regional_data)
+            _upsert_regional_facts(cursor, [
+                (year, month, region, sector, value * region_value / regional_total * DEMO_SEASONALITY[month - 1])
+                for year, sector, value, _, _ in sector_data
+                for region, region_value, _ in regional_data
+                for month in range(1, 13)
+            ])
+
+@timed("db.warm_caches")
+def warm_caches() -> int:
+    """Load the snapshot and prime the remaining loaders' caches; returns the number of getters called."""
+    get_snapshot()
+    warmers = [get_sector_filter_options, get_database_info, get_sector_page, get_sector_pivot]
+    years = get_regional_years()
+    if years:
+        warmers.append(lambda: get_regional_series(years[0], years[-1]))
+    for warm in warmers:
+        warm()
+    return len(warmers) + 1
+
+@st.cache_resource(show_spinner=False)
+def _warm_up(db_path: str) -> int:
+    return warm_caches()
+
+def warm_up() -> int:
+    """Prime the database caches once per process and database file.
+
+    app.py calls this at the end of the first run, after the page has been sent,
+    so the first paint does not wait for it.
+    """
+    return _warm_up(str(DB_PATH))
 
-@st.cache_data
+# The dashboard's hot reads are served from the process-wide snapshot: a year
+# is a zero-copy slice of its columns, and only the returned frame is built.
+
+@timed("db.get_sector_data", cache="snapshot")
 def get_sector_data(year: str) -> pd.DataFrame:
-    with sqlite3.connect(DB_PATH) as conn:
-        query = "SELECT sector, value, change, subsectors FROM sector_emissions WHERE year = ?"
-        df = pd.read_sql_query(query, conn, params=(year,))
-    return df
+    return get_snapshot().sector_frame(int(year))
 
-@st.cache_data
+@timed("db.get_all_sector_data", cache="snapshot")
 def get_all_sector_data() -> pd.DataFrame:
-    with sqlite3.connect(DB_PATH) as conn:
-        df = pd.read_sql_query("SELECT * FROM sector_emissions ORDER BY year, sector", conn)
-    return df
+    return get_snapshot().all_sectors_frame()
 
-@st.cache_data
+@timed("db.get_yearly_totals", cache="snapshot")
 def get_yearly_totals() -> pd.DataFrame:
-    with sqlite3.connect(DB_PATH) as conn:
-        df = pd.read_sql_query("SELECT * FROM yearly_totals ORDER BY year", conn)
-    return df
-
-@st.cache_data
-def get_regional_data() -> pd.DataFrame:
-    with sqlite3.connect(DB_PATH) as conn:
-        df = pd.read_sql_query("SELECT * FROM regional_data", conn)
-    return df
-
-def update_sector_emission(id: int, year: str, sector: str, value: int, change: float, subsectors: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+    return get_snapshot().totals_frame()
+
+@timed("db.get_regional_data", cache="snapshot")
+def get_regional_data(year: Optional[Any] = None) -> pd.DataFrame:
+    """Emissions per region for one year (the latest with regional data by default), from the yearly rollup."""
+    return get_snapshot().regional_frame(None if year is None else int(year))
+
+@timed("db.get_year_summary", cache="snapshot")
+def get_year_summary(year: Any) -> Dict[str, Any]:
+    """Total emissions of a year and its largest sector, computed on the snapshot without building a frame."""
+    snapshot = get_snapshot()
+    largest = snapshot.largest(int(year))
+    return {"total": snapshot.year_total(int(year)), "largest_sector": largest[0] if largest else None,
+            "largest_value": largest[1] if largest else 0}
+
+@dataclass
+class SectorPage:
+    rows: pd.DataFrame
+    next_cursor: Optional[int]
+
+SECTOR_PAGE_SIZE = 50
+
+@timed("db.get_sector_page", cache="sector_page")
+def get_sector_page(after_id: int = 0, limit: int = SECTOR_PAGE_SIZE, year: Optional[Any] = None,
+                    sector: Optional[str] = None, min_value: Optional[int] = None,
+                    max_value: Optional[int] = None) -> SectorPage:
+    """One page of sector records with id > after_id, filtered server-side.
+
+    Pass the returned next_cursor as after_id to fetch the following page;
+    it is None on the last page.
+    """
+    year = None if year is None else int(year)
+    return _load_sector_page(int(after_id), limit, year, sector, min_value, max_value,
+                             get_data_version("sector_emissions"))
+
+# Loaders take the table generation as an argument so it becomes part of the
+# st.cache_data key; superseded generations simply age out of max_entries.
+@st.cache_data(max_entries=128)
+@cache_miss("sector_page")
+def _load_sector_page(after_id: int, limit: int, year: Optional[int], sector: Optional[str],
+                      min_value: Optional[int], max_value: Optional[int], version: int) -> SectorPage:
+    clauses, params = ["id > ?"], [after_id]
+    for clause, param in (("year = ?", year), ("sector = ?", sector), ("value >= ?", min_value), ("value <= ?", max_value)):
+        if param is not None:
+            clauses.append(clause)
+            params.append(param)
+    query = f"""
+        SELECT id, year, sector, value, change, subsectors FROM sector_emission_rows
+        WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?
+    """
+    with get_pool().reader() as conn:
+        df = pd.read_sql_query(query, conn, params=(*params, limit + 1))
+    if len(df) > limit:
+        return SectorPage(df.iloc[:limit].reset_index(drop=True), int(df['id'].iloc[limit - 1]))
+    return SectorPage(df, None)
+
+def _month_index(period: Any, end: bool) -> int:
+    """Months since year 0 for 2025, '2025', '2025-Q2' or '2025-03'; `end` selects a year's or quarter's last month."""
+    text = str(period).strip().upper()
+    if "-Q" in text:
+        year, quarter = text.split("-Q")
+        if not 1 <= int(quarter) <= 4:
+            raise ValueError(f"Invalid quarter in {period!r}")
+        month = (int(quarter) - 1) * 3 + (3 if end else 1)
+    elif "-" in text:
+        year, month = text.split("-")
+        month = int(month)
+        if not 1 <= month <= 12:
+            raise ValueError(f"Invalid month in {period!r}")
+    else:
+        year, month = text, 12 if end else 1
+    return int(year) * 12 + month - 1
+
+def choose_rollup(start: Any, end: Any) -> str:
+    """Coarsest rollup level whose buckets exactly cover start..end."""
+    first, last = _month_index(start, False), _month_index(end, True)
+    return next(level for level, months in REGIONAL_LEVELS.items() if first % months == 0 and (last + 1) % months == 0)
+
+@timed("db.get_regional_series", cache="regional_series")
+def get_regional_series(start: Any, end: Any, level: Optional[str] = None) -> pd.DataFrame:
+    """Emissions per region and period from start to end inclusive, read from a rollup table.
+
+    Periods are years, 'YYYY-Qn' quarters or 'YYYY-MM' months. Without `level`
+    the coarsest rollup that covers the range exactly is used, so multi-year
+    ranges never touch the monthly tables.
+    """
+    first, last = _month_index(start, False), _month_index(end, True)
+    level = level or choose_rollup(start, end)
+    months = REGIONAL_LEVELS[level]
+    if first % months or (last + 1) % months:
+        raise ValueError(f"{start}..{end} does not cover whole {level}s")
+    return _load_regional_series(level, first, last, get_data_version("regional_data"))
+
+@st.cache_data(max_entries=32)
+@cache_miss("regional_series")
+def _load_regional_series(level: str, first: int, last: int, version: int) -> pd.DataFrame:
+    table, keys = REGIONAL_ROLLUPS[level]
+    months = REGIONAL_LEVELS[level]
+    bucket = lambda index: (index // 12, index % 12 // months + 1)[:len(keys)]
+    label = {"year": "CAST(t.year AS TEXT)", "quarter": "t.year || '-Q' || t.quarter",
+             "month": "printf('%d-%02d', t.year, t.month)"}[level]
+    columns = ", ".join(f"t.{column}" for column in keys)
+    placeholders = ", ".join("?" * len(keys))
+    query = f"""
+        SELECT {label} AS period, t.year, r.name AS region, ROUND(t.value, 2) AS value, r.color
+        FROM {table} t JOIN regions r ON r.id = t.region_id
+        WHERE ({columns}) BETWEEN ({placeholders}) AND ({placeholders})
+        ORDER BY {columns}, r.id
+    """
+    with get_pool().reader() as conn:
+        return pd.read_sql_query(query, conn, params=(*bucket(first), *bucket(last)))
+
+@timed("db.get_regional_years", cache="snapshot")
+def get_regional_years() -> List[int]:
+    return get_snapshot().regional_years
+
+@timed("db.get_sector_filter_options", cache="sector_filter_options")
+def get_sector_filter_options() -> Dict[str, List[Any]]:
+    return _load_sector_filter_options(get_data_version("yearly_totals"), get_data_version("sector_emissions"))
+
+@st.cache_data(max_entries=4)
+@cache_miss("sector_filter_options")
+def _load_sector_filter_options(totals_version: int, sector_version: int) -> Dict[str, List[Any]]:
+    with get_pool().reader() as conn:
+        # yearly_totals holds exactly one row per year present in sector_emissions
+        years = [row[0] for row in conn.execute("SELECT year FROM yearly_totals ORDER BY year")]
+        sectors = [row[0] for row in conn.execute("SELECT name FROM sectors ORDER BY name")]
+    return {"years": years, "sectors": sectors}
+
+@timed("db.get_sector_pivot", cache="sector_pivot")
+def get_sector_pivot() -> pd.DataFrame:
+    """Sector x year emissions for every year at once, so comparisons re-slice it instead of querying per year."""
+    return _load_sector_pivot(get_data_version("sector_emissions"))
+
+@st.cache_data(max_entries=4)
+@cache_miss("sector_pivot")
+def _load_sector_pivot(version: int) -> pd.DataFrame:
+    with get_pool().reader() as conn:
+        df = pd.read_sql_query("SELECT year, sector, SUM(value) AS value FROM sector_emission_rows GROUP BY year, sector", conn)
+    return df.pivot(index="sector", columns="year", values="value").rename_axis(index=None, columns=None)
+
+@timed("db.get_database_info", cache="database_info")
+def get_database_info() -> Dict[str, Any]:
+    return _load_database_info(get_data_version("sector_emissions"), get_data_version("regional_data"))
+
+@st.cache_data(max_entries=4)
+@cache_miss("database_info")
+def _load_database_info(sector_version: int, regional_version: int) -> Dict[str, Any]:
+    with get_pool().reader() as conn:
+        sector_records = conn.execute("SELECT COUNT(*) FROM sector_emissions").fetchone()[0]
+        regional_records = conn.execute("SELECT COUNT(*) FROM regional_facts").fetchone()[0]
+    return {"sector_records": sector_records, "regional_records": regional_records,
+            "years": get_sector_filter_options()["years"]}
+
+def _bump_sector_years(*years: Any) -> None:
+    """Invalidate cached sector frames for these years and the totals derived from them."""
+    versions = get_data_versions()
+    versions.bump("sector_emissions", *years)
+    versions.bump("yearly_totals", *years)
+
+def _rebuild_totals(cursor: sqlite3.Cursor, years: Optional[Iterable[int]] = None) -> None:
+    if years is None:
+        cursor.execute("DELETE FROM yearly_totals")
+        cursor.execute(REBUILD_YEARLY_TOTALS_SQL.format(where=""))
+        return
+    selected = json.dumps(sorted({int(year) for year in years}))
+    cursor.execute("DELETE FROM yearly_totals WHERE year IN (SELECT value FROM json_each(?))", (selected,))
+    cursor.execute(REBUILD_YEARLY_TOTALS_SQL.format(where="WHERE e.year IN (SELECT value FROM json_each(?))"), (selected,))
+
+@timed("db.rebuild_yearly_totals")
+def rebuild_yearly_totals(years: Optional[Iterable[int]] = None) -> int:
+    """Recompute yearly_totals from sector_emissions (all years by default) to repair drift."""
+    years = None if years is None else sorted(years)
+    with get_pool().writer() as conn:
         cursor = conn.cursor()
-        cursor.execute("UPDATE sector_emissions SET year=?, sector=?, value=?, change=?, subsectors=? WHERE id=?",
-                       (year, sector, value, change, subsectors, id))
-        conn.commit()
-    st.cache_data.clear()
+        _rebuild_totals(cursor, years)
+        rebuilt = cursor.execute("SELECT COUNT(*) FROM yearly_totals").fetchone()[0]
+        _audit(cursor, "rebuild_yearly_totals", {"years": years, "rows": rebuilt})
+    get_data_versions().bump("yearly_totals")
+    return rebuilt
+
+def update_sector_emission(id: int, year: str, sector: str, value: int, change: float, subsectors: str) -> Future:
+    """Queue an edit of one record; the future resolves once it is committed."""
+    def apply(cursor: sqlite3.Cursor) -> Tuple[Any, ...]:
+        old = cursor.execute("SELECT year FROM sector_emissions WHERE id=?", (id,)).fetchone()
+        sector_id = _resolve_ids(cursor, "sectors", "name", [sector])[sector]
+        subsector_id = _resolve_ids(cursor, "subsectors", "label", [subsectors])[subsectors]
+        cursor.execute("UPDATE sector_emissions SET year=?, sector_id=?, value=?, change=?, subsector_id=? WHERE id=?",
+                       (int(year), sector_id, value, change, subsector_id, id))
+        return (year, *(old or ()))
+
+    detail = {"id": id, "year": year, "sector": sector, "value": value, "change": change, "subsectors": subsectors}
+    return get_write_queue().submit("update_sector_emission", detail, apply, lambda years: _bump_sector_years(*years))
+
+def add_sector_emission(year: str, sector: str, value: int, change: float, subsectors: str) -> Future:
+    """Queue an insert, or an overwrite of the existing record for the same year and sector."""
+    detail = {"year": year, "sector": sector, "value": value, "change": change, "subsectors": subsectors}
+    return get_write_queue().submit("add_sector_emission", detail,
+                                    lambda cursor: _insert_sector_rows(cursor, [(year, sector, value, change, subsectors)]),
+                                    lambda _: _bump_sector_years(year))
+
+def delete_sector_emission(id: int) -> Future:
+    def apply(cursor: sqlite3.Cursor) -> Tuple[Any, ...]:
+        old = cursor.execute("SELECT year FROM sector_emissions WHERE id=?", (id,)).fetchone()
+        cursor.execute("DELETE FROM sector_emissions WHERE id=?", (id,))
+        return tuple(old or ())
+
+    return get_write_queue().submit("delete_sector_emission", {"id": id}, apply, lambda years: _bump_sector_years(*years))
+
+def _rebuild_rollups(cursor: sqlite3.Cursor, years: Optional[Iterable[int]] = None) -> None:
+    selected = None if years is None else json.dumps(sorted({int(year) for year in years}))
+    for level, (table, _) in REGIONAL_ROLLUPS.items():
+        if selected is None:
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(rebuild_rollup_sql(level))
+        else:
+            cursor.execute(f"DELETE FROM {table} WHERE year IN (SELECT value FROM json_each(?))", (selected,))
+            cursor.execute(rebuild_rollup_sql(level, "WHERE f.year IN (SELECT value FROM json_each(?))"), (selected,))
+
+def _upsert_regional_facts(cursor: sqlite3.Cursor, rows: Iterable[Tuple[Any, int, str, Optional[str], float]]) -> List[int]:
+    """Write (year, month, region, sector or None, value) facts and rebuild the touched rollups once."""
+    rows = list(rows)
+    region_ids = _resolve_ids(cursor, "regions", "name", {row[2] for row in rows})
+    sector_ids = _resolve_ids(cursor, "sectors", "name", {row[3] for row in rows if row[3] is not None})
+    years = set()
+    cursor.execute("UPDATE totals_maintenance SET deferred = 1")
+    for year, month, region, sector, value in rows:
+        key = (int(year), int(month), region_ids[region], None if sector is None else sector_ids[sector])
+        updated = cursor.execute("""
+            UPDATE regional_facts SET value = ? WHERE year = ? AND month = ? AND region_id = ? AND sector_id IS ?
+        """, (value, *key)).rowcount
+        if not updated:
+            cursor.execute("INSERT INTO regional_facts (year, month, region_id, sector_id, value) VALUES (?, ?, ?, ?, ?)",
+                           (*key, value))
+        years.add(key[0])
+    _rebuild_rollups(cursor, years)
+    cursor.execute("UPDATE totals_maintenance SET deferred = 0")
+    return sorted(years)
+
+@timed("db.upsert_regional_facts")
+def upsert_regional_facts(rows: Iterable[Tuple[Any, int, str, Optional[str], float]]) -> int:
+    """Load monthly regional facts, e.g. from the production feed; returns the number of rows written.
 
-def add_sector_emission(year: str, sector: str, value: int, change: float, subsectors: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+    Rows are (year, month, region, sector, value); sector may be None for
+    unattributed values. Unknown regions and sectors are created.
+    """
+    rows = list(rows)
+    with get_pool().writer() as conn:
         cursor = conn.cursor()
-        cursor.execute("INSERT INTO sector_emissions (year, sector, value, change, subsectors) VALUES (?, ?, ?, ?, ?)",
-                       (year, sector, value, change, subsectors))
-        conn.commit()
-    st.cache_data.clear()
+        years = _upsert_regional_facts(cursor, rows)
+        _audit(cursor, "upsert_regional_facts", {"rows": len(rows), "years": years})
+    get_data_versions().bump("regional_data", *years)
+    return len(rows)
 
-def delete_sector_emission(id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+@timed("db.rebuild_regional_rollups")
+def rebuild_regional_rollups(years: Optional[Iterable[int]] = None) -> int:
+    """Recompute the month/quarter/year rollups from regional_facts; returns the yearly rows rebuilt."""
+    years = None if years is None else sorted(years)
+    with get_pool().writer() as conn:
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM sector_emissions WHERE id=?", (id,))
-        conn.commit()
-    st.cache_data.clear()
+        _rebuild_rollups(cursor, years)
+        rebuilt = cursor.execute("SELECT COUNT(*) FROM regional_yearly").fetchone()[0]
+        _audit(cursor, "rebuild_regional_rollups", {"years": years, "rows": rebuilt})
+    get_data_versions().bump("regional_data")
+    return rebuilt
+
+def update_regional_data(id: int, region: str, value: int, color: str, year: Optional[Any] = None) -> Future:
+    """Queue a rename/recolor of a region and set its total for `year` (the latest regional year by default).
+
+    Existing monthly facts are scaled to the new total; a region without facts
+    that year gets twelve equal unattributed months.
+    """
+    def apply(cursor: sqlite3.Cursor) -> Tuple[int, bool]:
+        renamed = cursor.execute("SELECT name IS NOT ? OR color IS NOT ? FROM regions WHERE id=?", (region, color, id)).fetchone()
+        cursor.execute("UPDATE regions SET name=?, color=? WHERE id=?", (region, color, id))
+        target = year
+        if target is None:
+            target = cursor.execute("SELECT COALESCE((SELECT MAX(year) FROM regional_yearly), (SELECT MAX(year) FROM sector_emissions))").fetchone()[0]
+        target = int(target)
+        current = cursor.execute("SELECT value FROM regional_yearly WHERE year=? AND region_id=?", (target, id)).fetchone()
+        if current and current[0]:
+            cursor.execute("UPDATE regional_facts SET value = value * ? WHERE year=? AND region_id=?", (value / current[0], target, id))
+        else:
+            cursor.execute("DELETE FROM regional_facts WHERE year=? AND region_id=?", (target, id))
+            cursor.executemany("INSERT INTO regional_facts (year, month, region_id, sector_id, value) VALUES (?, ?, ?, NULL, ?)",
+                               [(target, month, id, value / 12) for month in range(1, 13)])
+        return target, bool(renamed and renamed[0])
+
+    def on_commit(result: Tuple[int, bool]) -> None:
+        target, renamed = result
+        # Name and color live on the shared regions row, so a rename or recolor touches every year
+        if renamed:
+            get_data_versions().bump("regional_data")
+        else:
+            get_data_versions().bump("regional_data", target)
+
+    detail = {"id": id, "region": region, "value": value, "color": color, "year": year}
+    return get_write_queue().submit("update_regional_data", detail, apply, on_commit)
+
+@dataclass
+class ImportReport:
+    rows_read: int = 0
+    rows_imported: int = 0
+    rows_rejected: int = 0
+    seconds: float = 0.0
 
-def update_regional_data(id: int, region: str, value: int, color: str) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+IMPORT_REQUIRED_COLUMNS = ("year", "sector", "value")
+IMPORT_CHUNK_ROWS = 100_000
+
+def _clean_sector_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Coerce and validate a CSV chunk column-wise, dropping rows that fail."""
+    year = pd.to_numeric(chunk["year"], errors="coerce")
+    value = pd.to_numeric(chunk["value"], errors="coerce")
+    if "change" in chunk:
+        # A blank change means no change; anything else must be numeric
+        blank = chunk["change"].astype("string").str.strip().fillna("") == ""
+        change = pd.to_numeric(chunk["change"].mask(blank, 0), errors="coerce")
+    else:
+        change = pd.Series(0.0, index=chunk.index)
+    sector = chunk["sector"].astype("string").str.strip()
+    subsectors = chunk["subsectors"].astype("string").str.strip().fillna("") if "subsectors" in chunk else pd.Series("", index=chunk.index)
+    valid = (year.notna() & (year % 1 == 0) & year.between(1800, 2200)
+             & value.notna() & (value >= 0) & (value % 1 == 0)
+             & change.notna() & sector.notna() & (sector != ""))
+    return pd.DataFrame({
+        "year": year[valid].astype("int64"),
+        "sector": sector[valid].astype(object),
+        "value": value[valid].astype("int64"),
+        "change": change[valid].astype("float64"),
+        "subsectors": subsectors[valid].astype(object),
+    })
+
+@timed("db.import_sector_csv")
+def import_sector_csv(source: Union[str, Path, BinaryIO], chunk_rows: int = IMPORT_CHUNK_ROWS) -> ImportReport:
+    """Stream a sector emissions CSV into the database in one transaction.
+
+    Rows are upserted on (year, sector); rows with a missing or invalid year,
+    sector or value (or a non-numeric change) are counted as rejected; a
+    blank change is stored as 0.
+    """
+    report = ImportReport()
+    years = set()
+    started = time.perf_counter()
+    with get_pool().writer() as conn:
         cursor = conn.cursor()
-        cursor.execute("UPDATE regional_data SET region=?, value=?, color=? WHERE id=?", (region, value, color, id))
-        conn.commit()
-    st.cache_data.clear()
+        # Skip the per-row totals triggers and rebuild the touched years once at the end
+        cursor.execute("UPDATE totals_maintenance SET deferred = 1")
+        for chunk in pd.read_csv(source, chunksize=chunk_rows, dtype={"sector": str, "subsectors": str},
+                                 skipinitialspace=True):
+            chunk.columns = chunk.columns.str.strip().str.lower()
+            missing = [column for column in IMPORT_REQUIRED_COLUMNS if column not in chunk]
+            if missing:
+                raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+            rows = _clean_sector_chunk(chunk)
+            report.rows_read += len(chunk)
+            report.rows_rejected += len(chunk) - len(rows)
+            if rows.empty:
+                continue
+            sector_ids = _resolve_ids(cursor, "sectors", "name", rows["sector"].unique())
+            subsector_ids = _resolve_ids(cursor, "subsectors", "label", rows["subsectors"].unique())
+            rows["sector"] = rows["sector"].map(sector_ids)
+            rows["subsectors"] = rows["subsectors"].map(subsector_ids)
+            # Inserting in index order keeps the (year, sector_id) B-tree writes sequential
+            rows = rows.sort_values(["year", "sector"], kind="stable")
+            cursor.executemany(_UPSERT_SECTOR_SQL, zip(
+                rows["year"].tolist(), rows["sector"].tolist(), rows["value"].tolist(),
+                rows["change"].tolist(), rows["subsectors"].tolist(),
+            ))
+            report.rows_imported += len(rows)
+            years.update(rows["year"].unique().tolist())
+        _rebuild_totals(cursor, years)
+        cursor.execute("UPDATE totals_maintenance SET deferred = 0")
+        _audit(cursor, "import_sector_csv", {"rows_read": report.rows_read, "rows_imported": report.rows_imported,
+                                             "rows_rejected": report.rows_rejected, "years": sorted(years)})
+    report.seconds = time.perf_counter() - started
+    if years:
+        _bump_sector_years(*years)
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Emissions database maintenance")
+    parser.add_argument("command", choices=["rebuild-totals", "rebuild-rollups"])
+    parser.add_argument("--db", default=str(DB_PATH), help="database file (default: %(default)s)")
+    args = parser.parse_args()
+    DB_PATH = Path(args.db)
+    init_database()
+    if args.command == "rebuild-rollups":
+        print(f"Rebuilt regional rollups ({rebuild_regional_rollups()} region-year rows) in {DB_PATH}")
+    else:
+        print(f"Rebuilt yearly_totals for {rebuild_yearly_totals()} year(s) in {DB_PATH}")
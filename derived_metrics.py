@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from database import get_data_version, get_pool
+from instrumentation import cache_miss, timed
+
+# World population in billions (UN World Population Prospects, mid-year)
+POPULATION_BILLIONS = {2019: 7.76, 2020: 7.84, 2021: 7.91, 2022: 7.98, 2023: 8.05, 2024: 8.12, 2025: 8.19}
+# IPCC 1.5 °C pathways: 43% below the baseline by 2030. Their baseline is 2019; the
+# data starts later, so the earliest year present stands in when the baseline is missing.
+TARGET_YEAR = 2030
+TARGET_REDUCTION = 0.43
+TARGET_BASELINE_YEAR = 2019
+
+# One pass over every year; LAG/FIRST_VALUE give the previous and first year per sector
+SECTOR_METRICS_SQL = """
+    SELECT year, sector, value, subsectors, change AS recorded_change,
+           LAG(value) OVER w AS previous_value,
+           FIRST_VALUE(year) OVER w AS first_year, FIRST_VALUE(value) OVER w AS first_value,
+           100.0 * value / SUM(value) OVER (PARTITION BY year) AS share
+    FROM sector_emission_rows
+    WINDOW w AS (PARTITION BY sector ORDER BY year)
+    ORDER BY year, sector
+"""
+TOTAL_METRICS_SQL = """
+    SELECT year, total, LAG(year) OVER w AS previous_year, LAG(total) OVER w AS previous_total,
+           FIRST_VALUE(year) OVER w AS first_year, FIRST_VALUE(total) OVER w AS first_total
+    FROM yearly_totals
+    WINDOW w AS (ORDER BY year)
+    ORDER BY year
+"""
+
+
+def _percent_change(value: pd.Series, previous: pd.Series) -> pd.Series:
+    return (value / previous.where(previous > 0) - 1) * 100
+
+def _cagr(value: pd.Series, first: pd.Series, years: pd.Series) -> pd.Series:
+    """Compound annual growth in % from the first year; NaN for the first year itself."""
+    growth = ((value / first.where(first > 0)) ** (1 / years.where(years > 0)) - 1) * 100
+    # 1 ** NaN is 1 in numpy, so mask the first year explicitly
+    return growth.where(years > 0)
+
+
+@dataclass
+class DerivedMetrics:
+    """Computed per data version. Changes are against the previous year present in the data."""
+    sectors: pd.DataFrame   # year, sector, value, share, yoy, cagr, subsectors
+    totals: pd.DataFrame    # year, total, previous_year, yoy, cagr, per_capita, target_gap
+    target: Optional[float]  # TARGET_YEAR emissions goal, Mt CO2e
+
+    def sector_metrics(self, year: Any) -> pd.DataFrame:
+        return self.sectors[self.sectors["year"] == int(year)].reset_index(drop=True)
+
+    def year_metrics(self, year: Any) -> Dict[str, Any]:
+        """The metric-card values for a year; values that cannot be computed are None."""
+        rows = self.totals[self.totals["year"] == int(year)]
+        metrics: Dict[str, Any] = {column: None for column in self.totals.columns if column != "year"}
+        if not rows.empty:
+            metrics.update({column: None if pd.isna(value) else float(value) for column, value in rows.iloc[0].items()
+                            if column != "year"})
+        if metrics["previous_year"] is not None:
+            metrics["previous_year"] = int(metrics["previous_year"])
+        metrics["target"] = self.target
+        return metrics
+
+
+def build_derived_metrics(sectors: pd.DataFrame, totals: pd.DataFrame) -> DerivedMetrics:
+    """Vectorized over the window-function rows of SECTOR_METRICS_SQL and TOTAL_METRICS_SQL."""
+    # A sector's first year has no previous value; only there the recorded change is kept
+    yoy = _percent_change(sectors["value"], sectors["previous_value"])
+    sectors = pd.DataFrame({
+        "year": sectors["year"],
+        "sector": sectors["sector"],
+        "value": sectors["value"],
+        "share": sectors["share"],
+        "yoy": yoy.where(sectors["previous_value"].notna(), sectors["recorded_change"]),
+        "cagr": _cagr(sectors["value"], sectors["first_value"], sectors["year"] - sectors["first_year"]),
+        "subsectors": sectors["subsectors"],
+    })
+
+    baseline = totals.loc[totals["year"] == TARGET_BASELINE_YEAR, "total"]
+    if baseline.empty:
+        baseline = totals["total"].head(1)
+    target = float(baseline.iloc[0]) * (1 - TARGET_REDUCTION) if len(baseline) else None
+    population = totals["year"].map(POPULATION_BILLIONS)
+    totals = pd.DataFrame({
+        "year": totals["year"],
+        "total": totals["total"],
+        "previous_year": totals["previous_year"],
+        "yoy": _percent_change(totals["total"], totals["previous_total"]),
+        "cagr": _cagr(totals["total"], totals["first_total"], totals["year"] - totals["first_year"]),
+        # Mt over billions of people is kg per person; / 1000 gives tonnes
+        "per_capita": totals["total"] / population / 1000,
+        # The cut still needed from this year's level to reach the target, in % (negative)
+        "target_gap": (target / totals["total"].where(totals["total"] > 0) - 1) * 100 if target is not None else np.nan,
+    })
+    return DerivedMetrics(sectors, totals, target)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+@cache_miss("derived_metrics")
+def _cached_metrics(sector_version: int, totals_version: int) -> DerivedMetrics:
+    with get_pool().reader() as conn:
+        sectors = pd.read_sql_query(SECTOR_METRICS_SQL, conn)
+        totals = pd.read_sql_query(TOTAL_METRICS_SQL, conn)
+    return build_derived_metrics(sectors, totals)
+
+@timed("db.get_derived_metrics", cache="derived_metrics")
+def get_derived_metrics() -> DerivedMetrics:
+    """Shared across sessions: treat the frames as read-only."""
+    return _cached_metrics(get_data_version("sector_emissions"), get_data_version("yearly_totals"))
@@ -0,0 +1,95 @@
+import csv
+import gzip
+import io
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+from database import get_pool
+from instrumentation import timed
+
+EXPORT_CHUNK_ROWS = 5000
+# Exports up to this size stay in memory; larger ones spill to a temporary file
+EXPORT_SPOOL_BYTES = 8 * 2**20
+
+# name -> (query, file name)
+EXPORTS: Dict[str, Tuple[str, str]] = {
+    "sector_emissions": (
+        "SELECT id, year, sector, value, change, subsectors FROM sector_emission_rows ORDER BY year, sector",
+        "sector_emissions.csv",
+    ),
+    "regional_data": (
+        """SELECT y.year, r.id, r.name AS region, ROUND(y.value, 2) AS value, r.color
+           FROM regional_yearly y JOIN regions r ON r.id = y.region_id
+           ORDER BY y.year, r.id""",
+        "regional_data.csv",
+    ),
+}
+
+
+def export_file_name(name: str, compress: bool = False) -> str:
+    file_name = EXPORTS[name][1]
+    return f"{file_name}.gz" if compress else file_name
+
+def iter_csv(query: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Encoded CSV for `query`, a header and then one chunk per `chunk_rows` rows.
+
+    A single SELECT reads from one WAL snapshot, so the rows are consistent even
+    while writes land, and writers are never blocked.
+    """
+    with get_pool().reader() as conn:
+        cursor = conn.execute(query)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            if not rows:
+                return
+            buffer.seek(0)
+            buffer.truncate()
+
+def _spool(chunks: Iterator[bytes], compress: bool) -> BinaryIO:
+    """Write `chunks` to a rewound temporary file, gzipped if asked."""
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    # mtime=0 keeps the gzip header stable, so the same data downloads as the same bytes
+    sink = gzip.GzipFile(fileobj=spool, mode="wb", mtime=0) if compress else spool
+    for chunk in chunks:
+        sink.write(chunk)
+    if compress:
+        sink.close()
+    spool.seek(0)
+    return spool
+
+@timed("db.export_csv")
+def export_csv(name: str, compress: bool = False) -> BinaryIO:
+    """One of EXPORTS as a CSV file object, built only when called (e.g. on a download click)."""
+    return _spool(iter_csv(EXPORTS[name][0]), compress)
+
+def _file_chunks(path: Path, chunk_bytes: int = 2**20) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_bytes):
+            yield chunk
+
+@timed("db.backup")
+def backup_database(compress: bool = False) -> BinaryIO:
+    """A consistent copy of the whole database via SQLite's online backup API.
+
+    The pages are copied in one step from a pooled read-only connection, i.e. from
+    a single WAL read snapshot: neither readers nor the writer wait on it, and
+    writes landing meanwhile are simply not in the copy.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "backup.db"
+        target = sqlite3.connect(path)
+        try:
+            with get_pool().reader() as conn:
+                conn.backup(target)
+            # A standalone file: fold the copied WAL setting back into a rollback journal
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+        return _spool(_file_chunks(path), compress)
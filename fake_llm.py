@@ -0,0 +1,194 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List
+
+# Questions mentioning these words make the fake "call" web search first, like the real model
+SEARCH_KEYWORDS = ("news", "latest", "policy", "policies")
+
+
+def default_reply(request: Dict[str, Any]) -> str:
+    question = request["messages"][-1]["content"] if request["messages"] else ""
+    return (f"[Offline] Simulated answer to \"{question}\". "
+            "Set a real ANTHROPIC_API_KEY and unset EMISSIONS_FAKE_LLM for live analysis.")
+
+
+class FakeMessageStream:
+    """Context manager mimicking anthropic's MessageStream event iteration."""
+
+    def __init__(self, blocks: List[SimpleNamespace], usage: SimpleNamespace, chunk_delay: float) -> None:
+        self._blocks = blocks
+        self._usage = usage
+        self._chunk_delay = chunk_delay
+
+    def __enter__(self) -> "FakeMessageStream":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        return False
+
+    def __iter__(self) -> Iterator[SimpleNamespace]:
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(
+            usage=SimpleNamespace(input_tokens=self._usage.input_tokens, output_tokens=0)))
+        for index, block in enumerate(self._blocks):
+            yield SimpleNamespace(type="content_block_start", index=index, content_block=block)
+            if block.type == "text":
+                for chunk in re.findall(r"\S+\s*", block.text):
+                    time.sleep(self._chunk_delay)
+                    yield SimpleNamespace(type="text", text=chunk)
+            yield SimpleNamespace(type="content_block_stop", index=index, content_block=block)
+        yield SimpleNamespace(type="message_delta", usage=SimpleNamespace(output_tokens=self._usage.output_tokens))
+        yield SimpleNamespace(type="message_stop")
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        return (event.text for event in self if event.type == "text")
+
+
+class FakeMessages:
+    def __init__(self, client: "FakeAnthropicClient") -> None:
+        self._client = client
+
+    def _blocks(self, request: Dict[str, Any]) -> List[SimpleNamespace]:
+        self._client.requests.append(request)
+        blocks = []
+        question = request["messages"][-1]["content"].lower() if request["messages"] else ""
+        if any(keyword in question for keyword in SEARCH_KEYWORDS):
+            tool_use_id = f"srvtoolu_fake_{len(self._client.requests)}"
+            blocks.append(SimpleNamespace(type="server_tool_use", id=tool_use_id, name="web_search", input={"query": question}))
+            blocks.append(SimpleNamespace(type="web_search_tool_result", tool_use_id=tool_use_id, content=[SimpleNamespace(
+                type="web_search_result", title="Offline search result", url="https://example.com/", page_age=None)]))
+        blocks.append(SimpleNamespace(type="text", text=self._client.reply(request)))
+        return blocks
+
+    @staticmethod
+    def _usage(request: Dict[str, Any], blocks: List[SimpleNamespace]) -> SimpleNamespace:
+        output_tokens = sum(len(block.text.split()) for block in blocks if block.type == "text")
+        return SimpleNamespace(input_tokens=len(json.dumps(request["system"])) // 4, output_tokens=output_tokens)
+
+    def create(self, **request: Any) -> SimpleNamespace:
+        time.sleep(self._client.latency)
+        blocks = self._blocks(request)
+        return SimpleNamespace(content=blocks, usage=self._usage(request, blocks), stop_reason="end_turn")
+
+    def stream(self, **request: Any) -> FakeMessageStream:
+        time.sleep(self._client.latency)
+        blocks = self._blocks(request)
+        return FakeMessageStream(blocks, self._usage(request, blocks), self._client.chunk_delay)
+
+
+class FakeAnthropicClient:
+    """Offline stand-in for anthropic.Anthropic supporting messages.create and messages.stream.
+
+    Every request is recorded in `requests` so tests can assert on what was sent.
+    """
+
+    def __init__(self, reply: Callable[[Dict[str, Any]], str] = default_reply,
+                 latency: float = 0.2, chunk_delay: float = 0.02) -> None:
+        self.reply = reply
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.requests: List[Dict[str, Any]] = []
+        self.messages = FakeMessages(self)
+
+
+class StubAnthropicServer:
+    """Local HTTP server speaking enough of the Messages API for the real SDK.
+
+    Point the SDK at it with ANTHROPIC_BASE_URL (or base_url=server.url). The
+    first `fail_first` requests are answered with `fail_status` (429 by
+    default) to exercise retries; `latency` delays every response.
+    """
+
+    def __init__(self, reply: Callable[[Dict[str, Any]], str] = default_reply, latency: float = 0.05,
+                 fail_first: int = 0, fail_status: int = 429, chunk_delay: float = 0.0) -> None:
+        self.reply = reply
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.chunk_delay = chunk_delay
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubAnthropicServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _next_failure(self, payload: Dict[str, Any]) -> bool:
+        with self._lock:
+            self.requests.append(payload)
+            return len(self.requests) <= self.fail_first
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = {}) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_events(self, events: List[Dict[str, Any]]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for event in events:
+                    self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(server.chunk_delay)
+                self.close_connection = True
+
+            def do_POST(self) -> None:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                time.sleep(server.latency)
+                if server._next_failure(payload):
+                    error = {"type": "error", "error": {"type": "rate_limit_error" if server.fail_status == 429 else "overloaded_error",
+                                                        "message": "stub failure"}}
+                    self._send_json(server.fail_status, error, {"retry-after": "0"})
+                    return
+                text = server.reply(payload)
+                usage = {"input_tokens": len(json.dumps(payload.get("system", ""))) // 4, "output_tokens": len(text.split())}
+                message = {"id": f"msg_stub_{len(server.requests)}", "type": "message", "role": "assistant",
+                           "model": payload.get("model", "stub"), "stop_reason": "end_turn", "stop_sequence": None}
+                if not payload.get("stream"):
+                    self._send_json(200, {**message, "content": [{"type": "text", "text": text}], "usage": usage})
+                    return
+                events = [
+                    {"type": "message_start", "message": {**message, "content": [], "stop_reason": None,
+                                                          "usage": {**usage, "output_tokens": 0}}},
+                    {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                    *({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}}
+                      for chunk in re.findall(r"\S+\s*", text)),
+                    {"type": "content_block_stop", "index": 0},
+                    {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                     "usage": {"output_tokens": usage["output_tokens"]}},
+                    {"type": "message_stop"},
+                ]
+                self._send_events(events)
+
+        return Handler
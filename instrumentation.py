@@ -0,0 +1,314 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import pandas as pd
+import streamlit as st
+
+# Fraction of calls that are measured: 1 records everything, 0 turns instrumentation off
+SAMPLE_RATE_ENV = "EMISSIONS_METRICS_SAMPLE_RATE"
+# Set to a port number to serve /metrics (Prometheus text) and /metrics.json
+METRICS_PORT_ENV = "EMISSIONS_METRICS_PORT"
+
+RING_SIZE = 5000
+# Prometheus-style upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Heavy dependencies imported on first use; the startup report shows whether they are loaded yet.
+# (Streamlit itself imports plotly.graph_objects, but not plotly.express.)
+LAZY_MODULES = ("anthropic", "plotly.express")
+# Counter name -> label name used for its key in the Prometheus export
+COUNTER_LABELS = {"cache_lookups": "cache", "cache_misses": "cache", "rows_returned": "name",
+                  "errors": "name", "llm_tokens": "type"}
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _sample_rate() -> float:
+    try:
+        return min(1.0, max(0.0, float(os.getenv(SAMPLE_RATE_ENV, "1"))))
+    except ValueError:
+        return 1.0
+
+
+def _row_count(result: Any) -> Optional[int]:
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    rows = getattr(result, "rows", None)
+    if isinstance(rows, pd.DataFrame):
+        return len(rows)
+    return None
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class Metrics:
+    """In-process latency histograms, counters and a ring buffer of recent events.
+
+    Everything is kept in memory for the lifetime of the process; the ring
+    buffer bounds memory no matter how long the app runs.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, ring_size: int = RING_SIZE) -> None:
+        self.sample_rate = sample_rate
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=ring_size)
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def observe(self, name: str, seconds: float, rows: Optional[int] = None, ok: bool = True) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+            self._events.append({"name": name, "seconds": seconds, "rows": rows, "ok": ok, "at": time.time()})
+            if rows is not None:
+                self._counters[("rows_returned", name)] = self._counters.get(("rows_returned", name), 0) + rows
+            if not ok:
+                self._counters[("errors", name)] = self._counters.get(("errors", name), 0) + 1
+
+    def count(self, metric: str, label: str, n: float = 1) -> None:
+        with self._lock:
+            self._counters[(metric, label)] = self._counters.get((metric, label), 0) + n
+
+    def reset(self) -> None:
+        with self._lock:
+            self._events.clear()
+            self._histograms.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    def events(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._events)
+
+    def counters(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            items = list(self._counters.items())
+        grouped: Dict[str, Dict[str, float]] = {}
+        for (metric, label), value in items:
+            grouped.setdefault(metric, {})[label] = value
+        return grouped
+
+    def latency_table(self) -> pd.DataFrame:
+        """Per-name call count and totals, with percentiles over the events still in the ring buffer."""
+        with self._lock:
+            totals = {name: (h.count, h.sum) for name, h in self._histograms.items()}
+        if not totals:
+            return pd.DataFrame(columns=["name", "calls", "mean_ms", "p50_ms", "p95_ms", "max_ms"])
+        recent = pd.DataFrame(self.events())
+        recent = recent.groupby("name")["seconds"].quantile([0.5, 0.95, 1.0]).unstack() * 1000
+        table = pd.DataFrame([(name, count, total / count * 1000) for name, (count, total) in totals.items()],
+                             columns=["name", "calls", "mean_ms"]).set_index("name")
+        table[["p50_ms", "p95_ms", "max_ms"]] = recent.reindex(table.index).to_numpy()
+        return table.sort_values("calls", ascending=False).reset_index()
+
+    def cache_ratios(self) -> pd.DataFrame:
+        """Hit ratio per cache: every public getter call is a lookup, every loader execution a miss."""
+        counters = self.counters()
+        lookups, misses = counters.get("cache_lookups", {}), counters.get("cache_misses", {})
+        rows = [(cache, total, misses.get(cache, 0), 1 - min(misses.get(cache, 0), total) / total if total else 0.0)
+                for cache, total in sorted(lookups.items())]
+        return pd.DataFrame(rows, columns=["cache", "lookups", "misses", "hit_ratio"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = {name: {"count": h.count, "sum_seconds": h.sum,
+                                 "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], h.counts))}
+                          for name, h in self._histograms.items()}
+        return {"sample_rate": self.sample_rate, "since": self.started_at, "histograms": histograms,
+                "counters": self.counters()}
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = [(name, list(h.counts), h.count, h.sum) for name, h in sorted(self._histograms.items())]
+        lines = ["# TYPE emissions_latency_seconds histogram"]
+        for name, counts, count, total in histograms:
+            cumulative = 0
+            for bound, bucket in zip([*map(str, BUCKETS), "+Inf"], counts):
+                cumulative += bucket
+                lines.append(f'emissions_latency_seconds_bucket{{name="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'emissions_latency_seconds_sum{{name="{name}"}} {total}')
+            lines.append(f'emissions_latency_seconds_count{{name="{name}"}} {count}')
+        for metric, values in sorted(self.counters().items()):
+            label = COUNTER_LABELS.get(metric, "name")
+            lines.append(f"# TYPE emissions_{metric}_total counter")
+            lines.extend(f'emissions_{metric}_total{{{label}="{key}"}} {value:g}' for key, value in sorted(values.items()))
+        return "\n".join(lines) + "\n"
+
+
+# Module-level so decorators applied at import time can reach it without a lookup
+METRICS = Metrics(_sample_rate())
+
+
+def timed(name: str, cache: Optional[str] = None) -> Callable[[F], F]:
+    """Record call latency and rows returned; with `cache`, also count a lookup of that cache."""
+    def decorate(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not METRICS.enabled or not METRICS.sampled():
+                return func(*args, **kwargs)
+            if cache is not None:
+                METRICS.count("cache_lookups", cache)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                METRICS.observe(name, time.perf_counter() - started, ok=False)
+                raise
+            METRICS.observe(name, time.perf_counter() - started, _row_count(result))
+            return result
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+def cache_miss(cache: str) -> Callable[[F], F]:
+    """Count executions of a cached loader; apply it underneath st.cache_data so it only runs on a miss."""
+    def decorate(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if METRICS.enabled and METRICS.sampled():
+                METRICS.count("cache_misses", cache)
+            return func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+class SectionTimer:
+    """Times consecutive sections of a script without re-indenting them.
+
+    Each start() closes the running section; stop() closes the last one. A
+    section cut short by st.rerun() or st.stop() is simply not recorded.
+    """
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+        self._current: Optional[Tuple[str, float]] = None
+
+    def start(self, name: str) -> None:
+        self.stop()
+        if METRICS.enabled and METRICS.sampled():
+            self._current = (f"{self.prefix}.{name}", time.perf_counter())
+
+    def stop(self) -> None:
+        if self._current is not None:
+            name, started = self._current
+            METRICS.observe(name, time.perf_counter() - started)
+            self._current = None
+
+
+class StartupReport:
+    """Cold-start timings of this process: each phase is recorded once, the first time it completes.
+
+    Phases are measured from the start of a script run, so "first_paint" is the
+    first full page render including module imports and database setup.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._phases: Dict[str, float] = {}
+
+    def mark(self, phase: str, started: float) -> None:
+        seconds = time.perf_counter() - started
+        with self._lock:
+            if phase in self._phases:
+                return
+            self._phases[phase] = seconds
+        METRICS.observe(f"startup.{phase}", seconds)
+
+    def table(self) -> pd.DataFrame:
+        with self._lock:
+            phases = list(self._phases.items())
+        table = pd.DataFrame(phases, columns=["phase", "seconds"])
+        table["ms"] = (table.pop("seconds") * 1000).round(1)
+        return table
+
+    @staticmethod
+    def lazy_modules() -> Dict[str, bool]:
+        return {name: name in sys.modules for name in LAZY_MODULES}
+
+
+STARTUP = StartupReport()
+
+
+def process_memory() -> Dict[str, int]:
+    """Current and peak resident set size of this process in bytes (0 where the platform does not say)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        peak = 0
+    try:
+        with open("/proc/self/statm") as statm:
+            current = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        current = 0
+    return {"rss_bytes": current, "peak_rss_bytes": peak}
+
+
+def record_tokens(usage: Dict[str, int]) -> None:
+    if METRICS.enabled:
+        for field, tokens in usage.items():
+            if tokens:
+                METRICS.count("llm_tokens", field, tokens)
+
+
+def _handler_class(metrics: Metrics) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path == "/metrics":
+                body, content_type = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+@st.cache_resource
+def start_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """Serve the metrics over HTTP once per process when EMISSIONS_METRICS_PORT is set."""
+    port = os.getenv(METRICS_PORT_ENV)
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", int(port)), _handler_class(METRICS))
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -0,0 +1,361 @@
+import os
+import random
+import sys
+import threading
+import time
+import streamlit as st
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+from instrumentation import METRICS, record_tokens
+
+# Set to any value to answer from fake_llm.FakeAnthropicClient instead of the real API
+FAKE_LLM_ENV = "EMISSIONS_FAKE_LLM"
+
+MAX_CONCURRENT_REQUESTS = 8
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+LATENCY_WINDOW = 500
+RETRYABLE_STATUS = (429, 529)
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """An upstream call that identical concurrent requests wait on instead of repeating."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamFlight:
+    """An upstream stream whose events are replayed to identical concurrent requests.
+
+    Events are kept until the stream ends, so a follower joining late still
+    receives the whole reply from the first event.
+    """
+
+    def __init__(self) -> None:
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self._changed = threading.Condition()
+
+    def publish(self, event: Any) -> None:
+        with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    def replay(self) -> Iterator[Any]:
+        index = 0
+        while True:
+            with self._changed:
+                while index >= len(self.events) and not self.done:
+                    self._changed.wait()
+                batch, finished, error = self.events[index:], self.done, self.error
+            yield from batch
+            index += len(batch)
+            if finished and index >= len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+
+# The anthropic SDK (with httpx and pydantic) takes over a second to import, so it is
+# loaded on first use rather than at startup; sessions that never call the API skip it.
+
+def api_error() -> type:
+    """anthropic.APIError, for except clauses; only evaluated once an exception is raised."""
+    import anthropic
+    return anthropic.APIError
+
+def _is_retryable(error: BaseException) -> bool:
+    # An SDK error can only exist if the SDK has been imported
+    anthropic = sys.modules.get("anthropic")
+    return anthropic is not None and isinstance(error, anthropic.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+def _usage(usage: Any) -> Dict[str, int]:
+    return {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """Process-wide access to the Messages API.
+
+    One client (and HTTP connection pool) is shared by every session.
+    Identical in-flight `create` calls, and `stream` calls given the same key,
+    are coalesced into one upstream request,
+    at most `max_concurrent` calls run at once, and 429/529 responses are
+    retried with full-jitter exponential backoff. With `client_factory` the
+    client is only created by the first API call, so reading stats is free.
+    """
+
+    def __init__(self, client: Any = None, max_concurrent: int = MAX_CONCURRENT_REQUESTS, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE_SECONDS, backoff_max: float = BACKOFF_MAX_SECONDS,
+                 client_factory: Optional[Callable[[], Any]] = None) -> None:
+        self._client = client
+        self._client_factory = client_factory
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self._active = 0
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "retries": 0, "errors": 0,
+                       **{field: 0 for field in USAGE_FIELDS}}
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, _retry_after(error) or 0.0)
+
+    def _record(self, kind: str, started: float, attempts: int, ok: bool, first_token: Optional[float] = None,
+                usage: Optional[Dict[str, int]] = None) -> None:
+        usage = usage or {field: 0 for field in USAGE_FIELDS}
+        sample = {"kind": kind, "seconds": time.perf_counter() - started, "attempts": attempts, "ok": ok,
+                  "first_token_seconds": None if first_token is None else first_token - started, "at": time.time(),
+                  **usage}
+        with self._lock:
+            self._recent.append(sample)
+            if not ok:
+                self._stats["errors"] += 1
+            for field, tokens in usage.items():
+                self._stats[field] += tokens
+        if METRICS.enabled:
+            METRICS.observe(f"llm.{kind}", sample["seconds"], ok=ok)
+            if sample["first_token_seconds"] is not None:
+                METRICS.observe(f"llm.{kind}.first_token", sample["first_token_seconds"])
+            record_tokens(usage)
+
+    def _acquire_slot(self) -> None:
+        self._semaphore.acquire()
+        with self._lock:
+            self._active += 1
+            self._stats["upstream_calls"] += 1
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self._active -= 1
+        self._semaphore.release()
+
+    def _with_retries(self, call: Callable[[], T], keep_slot: bool = False) -> Tuple[T, int]:
+        """Run `call` in a concurrency slot, retrying 429/529; returns (result, attempts).
+
+        With keep_slot the slot stays held on success and the caller must release it.
+        """
+        attempt = 0
+        while True:
+            self._acquire_slot()
+            try:
+                result = call()
+            except Exception as e:
+                self._release_slot()
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+            else:
+                if not keep_slot:
+                    self._release_slot()
+                return result, attempt + 1
+            # Back off without holding a slot so other sessions keep flowing
+            attempt += 1
+            self._count("retries")
+            time.sleep(delay)
+
+    def create(self, key: str, request: Dict[str, Any]) -> Any:
+        """messages.create, sharing one upstream call among concurrent callers with the same key."""
+        self._count("requests")
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            self._count("coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        started = time.perf_counter()
+        try:
+            flight.result, attempts = self._with_retries(lambda: self.client.messages.create(**request))
+            self._record("create", started, attempts, True, usage=_usage(getattr(flight.result, "usage", None)))
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            self._record("create", started, 0, False)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def stream(self, request: Dict[str, Any], key: Optional[str] = None) -> Iterator[Any]:
+        """messages.stream events, holding a concurrency slot until the stream ends.
+
+        With `key`, concurrent calls with the same key share one upstream stream:
+        the first caller leads it and the others replay its events. The first
+        event is read inside the retry loop, so 429/529 responses at stream start
+        are retried; nothing is retried once events were yielded.
+        """
+        self._count("requests")
+        if key is None:
+            return self._stream_upstream(request)
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _StreamFlight()
+            else:
+                flight.followers += 1
+        if leader:
+            return self._lead_stream(key, flight, request)
+        self._count("coalesced")
+        return self._follow_stream(flight)
+
+    def _lead_stream(self, key: str, flight: _StreamFlight, request: Dict[str, Any]) -> Iterator[Any]:
+        upstream = self._stream_upstream(request)
+        completed = False
+        error: Optional[BaseException] = None
+        try:
+            for event in upstream:
+                flight.publish(event)
+                yield event
+            completed = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            closed_early = not completed and error is None
+            with self._lock:
+                # Checked and removed under one lock so no follower can join an abandoned stream
+                orphaned = closed_early and flight.followers == 0
+                if orphaned:
+                    del self._streams[key]
+            if orphaned:
+                upstream.close()
+                flight.finish()
+            else:
+                if closed_early:
+                    # The leader's reply was cancelled: keep pumping for the sessions replaying it
+                    try:
+                        for event in upstream:
+                            flight.publish(event)
+                    except Exception as e:
+                        error = e
+                with self._lock:
+                    del self._streams[key]
+                flight.finish(error)
+
+    def _follow_stream(self, flight: _StreamFlight) -> Iterator[Any]:
+        try:
+            yield from flight.replay()
+        finally:
+            with self._lock:
+                flight.followers -= 1
+
+    def _stream_upstream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        started = time.perf_counter()
+
+        def open_stream() -> Tuple[Any, Iterator[Any], Any]:
+            manager = self.client.messages.stream(**request)
+            stream = manager.__enter__()
+            try:
+                events = iter(stream)
+                return manager, events, next(events, None)
+            except BaseException:
+                manager.__exit__(None, None, None)
+                raise
+
+        try:
+            (manager, events, event), attempts = self._with_retries(open_stream, keep_slot=True)
+        except BaseException:
+            self._record("stream", started, 0, False)
+            raise
+        first_token = None
+        ok = False
+        usage = {field: 0 for field in USAGE_FIELDS}
+        try:
+            while event is not None:
+                if first_token is None and event.type == "text":
+                    first_token = time.perf_counter()
+                elif event.type == "message_start":
+                    usage = _usage(event.message.usage)
+                elif event.type == "message_delta" and getattr(event, "usage", None) is not None:
+                    usage["output_tokens"] = event.usage.output_tokens
+                yield event
+                event = next(events, None)
+            ok = True
+        finally:
+            manager.__exit__(None, None, None)
+            self._release_slot()
+            self._record("stream", started, attempts, ok, first_token, usage)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            recent = list(self._recent)
+            stats["active"] = self._active
+            stats["in_flight_keys"] = len(self._inflight)
+        stats["max_concurrent"] = self.max_concurrent
+        stats.update(_latency_summary([s["seconds"] for s in recent if s["ok"]], "latency"))
+        stats.update(_latency_summary([s["first_token_seconds"] for s in recent if s["first_token_seconds"] is not None], "first_token"))
+        return stats
+
+
+def _latency_summary(samples: List[float], prefix: str) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {f"{prefix}_p50": pick(0.5), f"{prefix}_p95": pick(0.95), f"{prefix}_max": ordered[-1]}
+
+
+def make_client(api_key: str) -> Any:
+    """Real Anthropic client, or the offline fake when EMISSIONS_FAKE_LLM is set.
+
+    SDK-level retries are disabled because the gateway retries with its own backoff;
+    ANTHROPIC_BASE_URL (e.g. a fake_llm.StubAnthropicServer) is honoured by the SDK.
+    """
+    if os.getenv(FAKE_LLM_ENV):
+        from fake_llm import FakeAnthropicClient
+        return FakeAnthropicClient()
+    import anthropic
+    return anthropic.Anthropic(api_key=api_key, max_retries=0)
+
+@st.cache_resource
+def get_gateway(api_key: str) -> LLMGateway:
+    """Shared gateway per API key, created once per process."""
+    return LLMGateway(client_factory=lambda: make_client(api_key))
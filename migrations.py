@@ -0,0 +1,345 @@
+import sqlite3
+from typing import Callable, List, Tuple
+
+# (version, description, upgrade) — append new migrations, never edit applied ones
+Migration = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+
+
+def _baseline_schema(conn: sqlite3.Connection) -> None:
+    """Original schema; a no-op for databases created before migrations existed."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sector_emissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year TEXT NOT NULL,
+            sector TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            change REAL NOT NULL,
+            subsectors TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS yearly_totals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year TEXT NOT NULL UNIQUE,
+            total INTEGER NOT NULL,
+            energy INTEGER NOT NULL,
+            transport INTEGER NOT NULL,
+            industry INTEGER NOT NULL,
+            other INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS regional_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            region TEXT NOT NULL UNIQUE,
+            value INTEGER NOT NULL,
+            color TEXT NOT NULL
+        )
+    """)
+
+
+def _normalize_sector_emissions(conn: sqlite3.Connection) -> None:
+    """Integer years, sector/subsector lookup tables and a unique (year, sector) index.
+
+    Duplicate (year, sector) rows left by the old add form collapse to the most
+    recently inserted one.
+    """
+    conn.execute("CREATE TABLE sectors (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    conn.execute("CREATE TABLE subsectors (id INTEGER PRIMARY KEY, label TEXT NOT NULL UNIQUE)")
+    conn.execute("INSERT INTO sectors (name) SELECT sector FROM sector_emissions GROUP BY sector ORDER BY MIN(id)")
+    conn.execute("INSERT INTO subsectors (label) SELECT subsectors FROM sector_emissions GROUP BY subsectors ORDER BY MIN(id)")
+
+    conn.execute("""
+        CREATE TABLE sector_emissions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year INTEGER NOT NULL,
+            sector_id INTEGER NOT NULL REFERENCES sectors(id),
+            value INTEGER NOT NULL,
+            change REAL NOT NULL,
+            subsector_id INTEGER NOT NULL REFERENCES subsectors(id)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO sector_emissions_new (id, year, sector_id, value, change, subsector_id)
+        SELECT e.id, CAST(e.year AS INTEGER), s.id, e.value, e.change, ss.id
+        FROM sector_emissions e
+        JOIN sectors s ON s.name = e.sector
+        JOIN subsectors ss ON ss.label = e.subsectors
+        WHERE e.id IN (SELECT MAX(id) FROM sector_emissions GROUP BY CAST(year AS INTEGER), sector)
+    """)
+    conn.execute("DROP TABLE sector_emissions")
+    conn.execute("ALTER TABLE sector_emissions_new RENAME TO sector_emissions")
+    conn.execute("CREATE UNIQUE INDEX idx_sector_emissions_year_sector ON sector_emissions (year, sector_id)")
+    conn.execute("CREATE INDEX idx_sector_emissions_sector ON sector_emissions (sector_id)")
+    conn.execute("""
+        CREATE VIEW sector_emission_rows AS
+        SELECT e.id, e.year, s.name AS sector, e.value, e.change, ss.label AS subsectors
+        FROM sector_emissions e
+        JOIN sectors s ON s.id = e.sector_id
+        JOIN subsectors ss ON ss.id = e.subsector_id
+    """)
+
+    conn.execute("""
+        CREATE TABLE yearly_totals_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year INTEGER NOT NULL UNIQUE,
+            total INTEGER NOT NULL,
+            energy INTEGER NOT NULL,
+            transport INTEGER NOT NULL,
+            industry INTEGER NOT NULL,
+            other INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        INSERT INTO yearly_totals_new (id, year, total, energy, transport, industry, other)
+        SELECT id, CAST(year AS INTEGER), total, energy, transport, industry, other FROM yearly_totals
+    """)
+    conn.execute("DROP TABLE yearly_totals")
+    conn.execute("ALTER TABLE yearly_totals_new RENAME TO yearly_totals")
+
+
+# Sector buckets feeding the per-category columns of yearly_totals
+TOTALS_BUCKETS = {"Energy Production": "energy", "Transportation": "transport", "Industrial Process": "industry"}
+
+REBUILD_YEARLY_TOTALS_SQL = """
+    INSERT INTO yearly_totals (year, total, energy, transport, industry, other)
+    SELECT e.year, SUM(e.value),
+           SUM(CASE s.bucket WHEN 'energy' THEN e.value ELSE 0 END),
+           SUM(CASE s.bucket WHEN 'transport' THEN e.value ELSE 0 END),
+           SUM(CASE s.bucket WHEN 'industry' THEN e.value ELSE 0 END),
+           SUM(CASE s.bucket WHEN 'other' THEN e.value ELSE 0 END)
+    FROM sector_emissions e JOIN sectors s ON s.id = e.sector_id
+    {where}
+    GROUP BY e.year
+"""
+
+
+def _adjust_totals_sql(ref: str, sign: str) -> str:
+    """UPDATE applying one sector_emissions row (NEW or OLD) to its year's totals."""
+    bucket = f"(SELECT bucket FROM sectors WHERE id = {ref}.sector_id)"
+    columns = ", ".join(
+        f"{column} = {column} {sign} CASE WHEN {bucket} = '{column}' THEN {ref}.value ELSE 0 END"
+        for column in ("energy", "transport", "industry", "other")
+    )
+    return f"UPDATE yearly_totals SET total = total {sign} {ref}.value, {columns} WHERE year = {ref}.year;"
+
+
+def _derive_yearly_totals(conn: sqlite3.Connection) -> None:
+    """Maintain yearly_totals from sector_emissions with triggers instead of by hand.
+
+    The trigger WHEN clause lets bulk loads switch maintenance off inside their
+    own transaction and rebuild the touched years once at the end.
+    """
+    conn.execute("ALTER TABLE sectors ADD COLUMN bucket TEXT NOT NULL DEFAULT 'other'")
+    conn.executemany("UPDATE sectors SET bucket = ? WHERE name = ?",
+                     [(bucket, name) for name, bucket in TOTALS_BUCKETS.items()])
+    bucket_case = " ".join(f"WHEN '{name}' THEN '{bucket}'" for name, bucket in TOTALS_BUCKETS.items())
+    conn.execute(f"""
+        CREATE TRIGGER sectors_assign_bucket AFTER INSERT ON sectors BEGIN
+            UPDATE sectors SET bucket = CASE NEW.name {bucket_case} ELSE 'other' END WHERE id = NEW.id;
+        END
+    """)
+    conn.execute("CREATE TABLE totals_maintenance (id INTEGER PRIMARY KEY CHECK (id = 1), deferred INTEGER NOT NULL)")
+    conn.execute("INSERT INTO totals_maintenance (id, deferred) VALUES (1, 0)")
+    enabled = "(SELECT deferred FROM totals_maintenance) = 0"
+    # NOT EXISTS rather than INSERT OR IGNORE: an upsert's conflict policy overrides the trigger's
+    add_row = f"""
+        INSERT INTO yearly_totals (year, total, energy, transport, industry, other)
+        SELECT NEW.year, 0, 0, 0, 0, 0 WHERE NOT EXISTS (SELECT 1 FROM yearly_totals WHERE year = NEW.year);
+        {_adjust_totals_sql("NEW", "+")}
+    """
+    remove_row = f"""
+        {_adjust_totals_sql("OLD", "-")}
+        DELETE FROM yearly_totals WHERE year = OLD.year AND NOT EXISTS (SELECT 1 FROM sector_emissions WHERE year = OLD.year);
+    """
+    conn.execute(f"CREATE TRIGGER sector_emissions_totals_insert AFTER INSERT ON sector_emissions WHEN {enabled} BEGIN {add_row} END")
+    conn.execute(f"CREATE TRIGGER sector_emissions_totals_delete AFTER DELETE ON sector_emissions WHEN {enabled} BEGIN {remove_row} END")
+    conn.execute(f"""
+        CREATE TRIGGER sector_emissions_totals_update AFTER UPDATE OF year, sector_id, value ON sector_emissions
+        WHEN {enabled} BEGIN {remove_row} {add_row} END
+    """)
+    conn.execute("DELETE FROM yearly_totals")
+    conn.execute(REBUILD_YEARLY_TOTALS_SQL.format(where=""))
+
+
+def _add_response_cache(conn: sqlite3.Connection) -> None:
+    """Assistant responses shared across sessions; see response_cache.py."""
+    conn.execute("""
+        CREATE TABLE llm_response_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX idx_llm_response_cache_last_used ON llm_response_cache (last_used_at)")
+
+
+def _add_chat_messages(conn: sqlite3.Connection) -> None:
+    """Chat history per browser session; see chat_store.py."""
+    conn.execute("""
+        CREATE TABLE chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            turn INTEGER NOT NULL,
+            role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            UNIQUE (session_id, turn, role)
+        )
+    """)
+    conn.execute("CREATE INDEX idx_chat_messages_created ON chat_messages (created_at)")
+
+
+# Rollups of regional_facts: level -> (table, period key columns with their expression over a fact row)
+REGIONAL_ROLLUPS = {
+    "month": ("regional_monthly", {"year": "{ref}.year", "month": "{ref}.month"}),
+    "quarter": ("regional_quarterly", {"year": "{ref}.year", "quarter": "({ref}.month + 2) / 3"}),
+    "year": ("regional_yearly", {"year": "{ref}.year"}),
+}
+
+
+def _rollup_match(keys: dict, ref: str) -> str:
+    return " AND ".join(f"{column} = {expr.format(ref=ref)}" for column, expr in keys.items()) + f" AND region_id = {ref}.region_id"
+
+def _rollup_add_sql(table: str, keys: dict, ref: str) -> str:
+    columns = ", ".join(keys)
+    values = ", ".join(expr.format(ref=ref) for expr in keys.values())
+    match = _rollup_match(keys, ref)
+    return f"""
+        INSERT INTO {table} ({columns}, region_id, value, facts)
+        SELECT {values}, {ref}.region_id, 0, 0 WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {match});
+        UPDATE {table} SET value = value + {ref}.value, facts = facts + 1 WHERE {match};
+    """
+
+def _rollup_remove_sql(table: str, keys: dict, ref: str) -> str:
+    match = _rollup_match(keys, ref)
+    return f"""
+        UPDATE {table} SET value = value - {ref}.value, facts = facts - 1 WHERE {match};
+        DELETE FROM {table} WHERE {match} AND facts = 0;
+    """
+
+def rebuild_rollup_sql(level: str, where: str = "") -> str:
+    """INSERT recomputing one rollup level from regional_facts; `where` filters facts aliased as f."""
+    table, keys = REGIONAL_ROLLUPS[level]
+    columns = ", ".join(keys)
+    values = ", ".join(expr.format(ref="f") for expr in keys.values())
+    return f"""
+        INSERT INTO {table} ({columns}, region_id, value, facts)
+        SELECT {values}, f.region_id, SUM(f.value), COUNT(*) FROM regional_facts f {where}
+        GROUP BY {values}, f.region_id
+    """
+
+
+def _add_regional_facts(conn: sqlite3.Connection) -> None:
+    """Monthly regional facts per sector with trigger-maintained month/quarter/year rollups.
+
+    The regional_data snapshot carries no period, so each region's value is
+    loaded as twelve equal monthly facts of the latest sector year, without a
+    sector (sector_id NULL means unattributed).
+    """
+    conn.execute("CREATE TABLE regions (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, color TEXT NOT NULL DEFAULT '#64748b')")
+    conn.execute("""
+        CREATE TABLE regional_facts (
+            id INTEGER PRIMARY KEY,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL CHECK (month BETWEEN 1 AND 12),
+            region_id INTEGER NOT NULL REFERENCES regions(id),
+            sector_id INTEGER REFERENCES sectors(id),
+            value REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX idx_regional_facts_key ON regional_facts (year, month, region_id, IFNULL(sector_id, 0))")
+    for table, keys in REGIONAL_ROLLUPS.values():
+        key_columns = ", ".join(f"{column} INTEGER NOT NULL" for column in keys)
+        conn.execute(f"""
+            CREATE TABLE {table} (
+                {key_columns},
+                region_id INTEGER NOT NULL REFERENCES regions(id),
+                value REAL NOT NULL,
+                facts INTEGER NOT NULL,
+                PRIMARY KEY ({", ".join(keys)}, region_id)
+            ) WITHOUT ROWID
+        """)
+
+    # Same switch as the yearly_totals triggers, so bulk loads can rebuild once at the end
+    enabled = "(SELECT deferred FROM totals_maintenance) = 0"
+    add_fact = "".join(_rollup_add_sql(table, keys, "NEW") for table, keys in REGIONAL_ROLLUPS.values())
+    remove_fact = "".join(_rollup_remove_sql(table, keys, "OLD") for table, keys in REGIONAL_ROLLUPS.values())
+    conn.execute(f"CREATE TRIGGER regional_facts_rollup_insert AFTER INSERT ON regional_facts WHEN {enabled} BEGIN {add_fact} END")
+    conn.execute(f"CREATE TRIGGER regional_facts_rollup_delete AFTER DELETE ON regional_facts WHEN {enabled} BEGIN {remove_fact} END")
+    conn.execute(f"""
+        CREATE TRIGGER regional_facts_rollup_update AFTER UPDATE OF year, month, region_id, value ON regional_facts
+        WHEN {enabled} BEGIN {remove_fact} {add_fact} END
+    """)
+
+    conn.execute("INSERT INTO regions (id, name, color) SELECT id, region, color FROM regional_data ORDER BY id")
+    latest_year = conn.execute("SELECT MAX(year) FROM sector_emissions").fetchone()[0]
+    if latest_year is not None:
+        conn.execute("""
+            WITH RECURSIVE months (month) AS (SELECT 1 UNION ALL SELECT month + 1 FROM months WHERE month < 12)
+            INSERT INTO regional_facts (year, month, region_id, sector_id, value)
+            SELECT ?, months.month, r.id, NULL, r.value / 12.0 FROM regional_data r CROSS JOIN months
+        """, (latest_year,))
+    conn.execute("DROP TABLE regional_data")
+
+
+def _add_audit_log(conn: sqlite3.Connection) -> None:
+    """Append-only record of admin writes, inserted in the same transaction as the write itself.
+
+    No secondary indexes: rowid order is time order, so an audit row costs one
+    append to the table's B-tree.
+    """
+    conn.execute("""
+        CREATE TABLE audit_log (
+            id INTEGER PRIMARY KEY,
+            at REAL NOT NULL,
+            action TEXT NOT NULL,
+            detail TEXT NOT NULL
+        )
+    """)
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "baseline schema", _baseline_schema),
+    (2, "normalize sector_emissions and use integer years", _normalize_sector_emissions),
+    (3, "derive yearly_totals from sector_emissions", _derive_yearly_totals),
+    (4, "add llm_response_cache", _add_response_cache),
+    (5, "add chat_messages", _add_chat_messages),
+    (6, "time-resolved regional facts with rollups", _add_regional_facts),
+    (7, "add audit_log", _add_audit_log),
+]
+
+
+def _ensure_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    _ensure_version_table(conn)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def run_migrations(pool) -> List[int]:
+    """Apply pending migrations in order, one writer transaction each.
+
+    `pool` is a database.ConnectionPool; the version is re-read inside every
+    transaction so concurrent processes never apply the same step twice.
+    """
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        with pool.writer() as conn:
+            if current_version(conn) >= version:
+                continue
+            upgrade(conn)
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
+        applied.append(version)
+    return applied
@@ -0,0 +1,85 @@
+import pandas as pd
+import streamlit as st
+from typing import Any, Dict, List
+from database import get_data_version, get_yearly_totals
+from derived_metrics import TARGET_REDUCTION, TARGET_YEAR, DerivedMetrics, get_derived_metrics
+
+# Rough chars-per-token ratio for English text and numbers; good enough for budgeting
+CHARS_PER_TOKEN = 4
+HISTORY_TOKEN_BUDGET = 2000
+
+INSTRUCTIONS = """You are an expert climate data analyst and AI assistant for an Emissions Monitor Dashboard.
+
+Your task is to answer user questions about this data, analyze trends, and provide insights.
+If the user asks about recent climate news or policies that are not in the data context, you should use the web_search tool.
+Always be professional, objective, and reference the specific numbers when discussing sectors.
+
+All values are Mt CO2e. Tables are pipe-separated with a header row."""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float):
+        return "" if pd.isna(value) else f"{value:g}"
+    return str(value)
+
+def _table(df: pd.DataFrame) -> str:
+    rows = ["|".join(map(str, df.columns))]
+    rows.extend("|".join(map(_cell, row)) for row in df.itertuples(index=False, name=None))
+    return "\n".join(rows)
+
+def _format_context(metrics: DerivedMetrics, totals: pd.DataFrame) -> str:
+    """Sector x year matrices plus yearly totals and derived metrics; subsectors are listed once per sector."""
+    sectors = metrics.sectors
+    values = sectors.pivot_table(index="sector", columns="year", values="value", aggfunc="sum", sort=False)
+    changes = sectors.pivot_table(index="sector", columns="year", values="yoy", aggfunc="last", sort=False)
+    subsectors = sectors.drop_duplicates("sector", keep="last").set_index("sector")["subsectors"]
+    totals = totals.drop(columns="id", errors="ignore")
+    derived = metrics.totals[["year", "yoy", "cagr", "per_capita", "target_gap"]].rename(columns={
+        "yoy": "total_yoy_%", "cagr": "cagr_since_first_year_%", "per_capita": "t_per_capita",
+        "target_gap": f"cut_needed_for_{TARGET_YEAR}_target_%"})
+    target = f" ({TARGET_YEAR} target: {metrics.target:,.0f} Mt CO2e, {TARGET_REDUCTION:.0%} below baseline)" if metrics.target else ""
+    return "\n\n".join([
+        "Sector emissions by year:\n" + _table(values.reset_index()),
+        "Sector YoY change % by year:\n" + _table(changes.round(1).reset_index()),
+        "Yearly totals:\n" + _table(totals),
+        f"Derived yearly metrics{target}:\n" + _table(derived.round(2)),
+        "Key subsectors:\n" + "\n".join(f"{sector}: {subs}" for sector, subs in subsectors.items()),
+    ])
+
+@st.cache_data(max_entries=8)
+def _data_context(sector_version: int, totals_version: int) -> str:
+    return _format_context(get_derived_metrics(), get_yearly_totals())
+
+def build_system_blocks(current_year: str, total_emissions: float) -> List[Dict[str, Any]]:
+    """System prompt as content blocks: a cacheable data prefix, then the per-turn view.
+
+    The first block covers every year, so it only changes when the data does and
+    is shared by all sessions regardless of the selected year.
+    """
+    context = _data_context(get_data_version("sector_emissions"), get_data_version("yearly_totals"))
+    return [
+        {"type": "text", "text": f"{INSTRUCTIONS}\n\n{context}", "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": f"Current Dashboard Context:\n- Selected Year: {current_year}\n"
+                                 f"- Total Global Emissions for year: {total_emissions:,.0f} Mt CO2e"},
+    ]
+
+def trim_history(messages: List[Dict[str, str]], budget_tokens: int = HISTORY_TOKEN_BUDGET) -> List[Dict[str, str]]:
+    """Most recent messages that fit the token budget, always keeping the latest one.
+
+    The window never starts with an assistant turn, as the Messages API requires.
+    """
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for message in reversed(messages):
+        cost = estimate_tokens(message["content"])
+        if kept and used + cost > budget_tokens:
+            break
+        kept.append({"role": message["role"], "content": message["content"]})
+        used += cost
+    kept.reverse()
+    while len(kept) > 1 and kept[0]["role"] != "user":
+        kept.pop(0)
+    return kept
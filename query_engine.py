@@ -0,0 +1,202 @@
+import re
+import pandas as pd
+import streamlit as st
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from database import get_data_version, get_regional_series, get_regional_years, get_yearly_totals
+from derived_metrics import get_derived_metrics
+from instrumentation import timed
+
+# Questions the dashboard data cannot answer go to the LLM
+OPEN_ENDED = re.compile(r"\b(news|latest|polic(y|ies)|why|explain|cause[sd]?|should|recommend|predict|forecast|compar(e|ed|ing|ison)|versus|vs|target|paris|net[- ]zero"
+                        r"|reduc(e|ed|ing|tion)|cut(s|ting)?|mitigat\w*|decarboni[sz]\w*|be done|effects?|impacts?|health|solutions?)\b")
+
+# Checked in order; the first match decides the intent. Patterns flagged True are
+# built on everyday words ("main", "total", "change") and only count when the
+# question also names a data subject: a sector, a region, SUBJECT_PATTERN or a year.
+INTENT_PATTERNS = [
+    ("regional", re.compile(r"\bregion(s|al)?\b|\bcontinents?\b|\bgeograph|\bcountr(y|ies)\b"), False),
+    ("fastest_growing", re.compile(r"\b(fastest|quickest)[- ]?grow|\bgr[eo]w(n|s|ing|th)? (the )?(most|fastest)|\b(biggest|largest) (increase|rise|growth)"), False),
+    ("fastest_declining", re.compile(r"\b(fastest|quickest)[- ]?(declin|shrink|fall)|\b(declin|shr[iu]nk|fell|drop)\w* (the )?most|\b(biggest|largest) (decrease|decline|drop|fall)"), False),
+    ("trend", re.compile(r"\btrends?\b|\bover time\b|\bhistor|\bover the (years|period)\b|\bsince (19|20)\d\d\b"), False),
+    ("share", re.compile(r"\bshares?\b|\bpercent(age)?\b|\bproportion\b|\bfraction\b|%|\bbreakdown\b"), False),
+    ("yoy", re.compile(r"\byoy\b|\byear[- ]over[- ]year\b|\b(previous|last|prior) year\b"), False),
+    ("yoy", re.compile(r"\bchanged?\b|\bgrowth\b|\bincreased?\b|\bdecreased?\b"), True),
+    ("smallest", re.compile(r"\b(smallest|lowest|least|minimum|fewest)\b"), True),
+    ("largest", re.compile(r"\b(largest|biggest|highest|most|top|main|primary|leading|maximum)\b"), True),
+    ("total", re.compile(r"\btotal\b|\boverall\b|\bglobal\b|\ball sectors\b|\bhow much\b|\bemissions (in|for) (19|20)\d\d\b"), True),
+]
+# A question that only names a sector is answered locally when it asks for the sector's figures
+SECTOR_LOOKUP = re.compile(r"^(tell me (more )?about|what about|how about|and|(info|information|details|stats|figures|numbers) (on|about|for))\b"
+                           r"|\b(emissions?|emitted) (in|for|during) (19|20)\d\d\b")
+SUBJECT_PATTERN = re.compile(r"\bsectors?\b|\bsources?\b|\bemitters?\b|\bemit(s|ted|ting)?\b")
+
+SECTOR_SYNONYMS = {
+    "power": "Energy Production", "electricity": "Energy Production", "fossil": "Energy Production",
+    "transport": "Transportation", "vehicles": "Transportation", "aviation": "Transportation", "shipping": "Transportation",
+    "industry": "Industrial Process", "industrial": "Industrial Process", "manufacturing": "Industrial Process",
+    "farming": "Agriculture", "livestock": "Agriculture",
+    "housing": "Buildings", "residential": "Buildings",
+    "landfill": "Waste", "landfills": "Waste",
+}
+YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+STOPWORDS = {"and", "the", "process", "production", "other"}
+
+
+@dataclass
+class Match:
+    intent: str
+    sector: Optional[str] = None
+    year: Optional[int] = None
+
+
+@dataclass
+class Aggregates:
+    """Dashboard data reshaped once per data version for constant-time lookups."""
+    values: pd.DataFrame        # sector x year, Mt CO2e
+    shares: pd.DataFrame        # sector x year, % of the year's total
+    yoy: pd.DataFrame           # sector x year, % change from the previous year in the data
+    totals: pd.Series           # year -> total
+    regional: pd.DataFrame      # region x year, Mt CO2e
+    sector_terms: Dict[str, str]
+
+    @property
+    def years(self) -> List[int]:
+        return list(self.values.columns)
+
+
+def build_aggregates(sectors: pd.DataFrame, totals: pd.DataFrame, regional: pd.DataFrame) -> Aggregates:
+    """`sectors` is DerivedMetrics.sectors, so YoY agrees with the dashboard's."""
+    values = sectors.pivot_table(index="sector", columns="year", values="value", aggfunc="sum").sort_index(axis=1)
+    year_totals = totals.set_index("year")["total"].reindex(values.columns).fillna(values.sum()).astype(float)
+    yoy = sectors.pivot_table(index="sector", columns="year", values="yoy", aggfunc="last", dropna=False).reindex_like(values)
+    regional = regional.pivot_table(index="region", columns="year", values="value", aggfunc="sum").sort_index(axis=1)
+    terms = {}
+    for sector in values.index:
+        terms[sector.lower()] = sector
+        for word in re.findall(r"[a-z]+", sector.lower()):
+            if len(word) > 3 and word not in STOPWORDS:
+                terms.setdefault(word, sector)
+    terms.update({term: sector for term, sector in SECTOR_SYNONYMS.items() if sector in values.index})
+    return Aggregates(values, values.div(year_totals, axis=1) * 100, yoy, year_totals, regional, terms)
+
+@st.cache_resource(max_entries=4)
+def _cached_aggregates(sector_version: int, totals_version: int, regional_version: int) -> Aggregates:
+    years = get_regional_years()
+    regional = get_regional_series(years[0], years[-1]) if years else pd.DataFrame(columns=["region", "year", "value"])
+    return build_aggregates(get_derived_metrics().sectors, get_yearly_totals(), regional)
+
+def get_aggregates() -> Aggregates:
+    return _cached_aggregates(get_data_version("sector_emissions"), get_data_version("yearly_totals"),
+                              get_data_version("regional_data"))
+
+
+def _is_sector_lookup(q: str, sector_terms: Dict[str, str]) -> bool:
+    """True for "tell me about X", "X emissions in 2024" or just "X?", not for other questions about X."""
+    bare = " ".join(re.sub(r"\b(the|sector|emissions?)\b|[^\w\s]", " ", q).split())
+    return bare in sector_terms or SECTOR_LOOKUP.search(q) is not None
+
+
+def match_intent(query: str, sector_terms: Dict[str, str], regions: Iterable[str] = ()) -> Optional[Match]:
+    """Classify a question, or return None if it needs the LLM."""
+    q = query.lower()
+    if OPEN_ENDED.search(q):
+        return None
+    year_match = YEAR_PATTERN.search(q)
+    year = int(year_match.group()) if year_match else None
+    # Longest term first so "energy production" wins over "energy"
+    sector = next((sector_terms[term] for term in sorted(sector_terms, key=len, reverse=True)
+                   if re.search(rf"\b{re.escape(term)}\b", q)), None)
+    intent, needs_subject = next(((name, gated) for name, pattern, gated in INTENT_PATTERNS if pattern.search(q)), (None, False))
+    if needs_subject and sector is None and year is None and not SUBJECT_PATTERN.search(q) \
+            and not any(re.search(rf"\b{re.escape(region.lower())}\b", q) for region in regions):
+        return None
+    if intent is None:
+        if sector is None or not _is_sector_lookup(q, sector_terms):
+            return None
+        intent = "sector"
+    elif sector is not None and intent in ("largest", "smallest", "total"):
+        intent = "sector"
+    return Match(intent, sector, year)
+
+
+def _mt(value: float) -> str:
+    return f"{value:,.0f} Mt CO2e"
+
+def _answer(match: Match, agg: Aggregates, year: int) -> str:
+    values, total = agg.values[year].dropna(), agg.totals[year]
+    if match.intent == "regional":
+        regional = agg.regional[year].dropna() if year in agg.regional.columns else pd.Series(dtype=float)
+        if not regional.sum():
+            return f"I don't have regional data for {year}."
+        regional = regional.sort_values(ascending=False)
+        shares = regional / regional.sum() * 100
+        others = ", ".join(f"{region} ({shares[region]:.1f}%)" for region in regional.index[1:4])
+        lead = regional.index[0]
+        return (f"In {year}, {lead} leads regional emissions with {_mt(regional[lead])} ({shares[lead]:.1f}% of the regional total), "
+                f"followed by {others}. {len(regional)} regions are tracked.")
+    if match.intent == "trend":
+        series = agg.values.loc[match.sector].dropna() if match.sector else agg.totals
+        label = f"{match.sector} emissions" if match.sector else "Total emissions"
+        (first_year, first), (last_year, last) = next(series.items()), list(series.items())[-1]
+        span = last_year - first_year
+        cagr = ((last / first) ** (1 / span) - 1) * 100 if span and first else 0.0
+        peak_year = series.idxmax()
+        return (f"{label} went from {_mt(first)} in {first_year} to {_mt(last)} in {last_year}, "
+                f"a {(last / first - 1) * 100:+.1f}% change ({cagr:+.1f}% per year). The peak was {_mt(series[peak_year])} in {peak_year}.")
+    if match.intent in ("fastest_growing", "fastest_declining"):
+        changes = agg.yoy[year].dropna()
+        if changes.empty:
+            return f"There is no year-over-year change data for {year}."
+        growing = match.intent == "fastest_growing"
+        ranked = changes.sort_values(ascending=not growing)
+        sector, change = ranked.index[0], ranked.iloc[0]
+        if not (change > 0 if growing else change < 0):
+            return f"No sector {'grew' if growing else 'declined'} in {year}; the closest was {sector} at {change:+.1f}% year over year."
+        # A runner-up is only named if it moved the same way
+        runner_up = (f" Next is {ranked.index[1]} at {ranked.iloc[1]:+.1f}%."
+                     if len(ranked) > 1 and (ranked.iloc[1] > 0 if growing else ranked.iloc[1] < 0) else "")
+        verb = "grew fastest" if growing else "fell the most"
+        return f"In {year}, {sector} {verb} at {change:+.1f}% year over year, reaching {_mt(values[sector])}.{runner_up}"
+    if match.intent == "share":
+        if match.sector:
+            return (f"{match.sector} accounted for {agg.shares.at[match.sector, year]:.1f}% of {year} emissions "
+                    f"({_mt(values[match.sector])} of {_mt(total)}).")
+        shares = agg.shares[year].dropna().sort_values(ascending=False)
+        return f"Share of {year} emissions: " + ", ".join(f"{sector} {share:.1f}%" for sector, share in shares.items()) + "."
+    if match.intent == "yoy":
+        if match.sector:
+            change = agg.yoy.at[match.sector, year]
+            if pd.isna(change):
+                return f"{match.sector} emissions were {_mt(values[match.sector])} in {year}; there is no earlier year to compare with."
+            direction = "unchanged" if round(change, 1) == 0 else f"{'up' if change > 0 else 'down'} {abs(change):.1f}%"
+            return f"{match.sector} emissions were {_mt(values[match.sector])} in {year}, {direction} from the previous year."
+        previous = agg.totals.shift(1)[year]
+        if pd.isna(previous):
+            return f"Total emissions were {_mt(total)} in {year}; there is no earlier year to compare with."
+        return f"Total emissions were {_mt(total)} in {year}, {(total / previous - 1) * 100:+.1f}% from {_mt(previous)} the year before."
+    if match.intent in ("largest", "smallest"):
+        sector = values.idxmax() if match.intent == "largest" else values.idxmin()
+        return (f"{sector} is the {match.intent} source in {year} at {_mt(values[sector])}, "
+                f"{agg.shares.at[sector, year]:.1f}% of the {_mt(total)} total.")
+    if match.intent == "sector":
+        sector = match.sector
+        return (f"{sector} emitted {_mt(values[sector])} in {year} ({agg.shares.at[sector, year]:.1f}% of total), "
+                f"a {agg.yoy.at[sector, year]:+.1f}% change from the previous year. "
+                f"It ranks #{int(values.rank(ascending=False)[sector])} of {len(values)} sectors.")
+    return f"Total emissions in {year} were {_mt(total)} ({total / 1000:.1f} Gt) across {len(values)} sectors."
+
+
+@timed("chat.answer_locally")
+def answer_locally(query: str, selected_year: str) -> Optional[str]:
+    """Exact answer computed from the dashboard data, or None for open-ended questions."""
+    agg = get_aggregates()
+    match = match_intent(query, agg.sector_terms, agg.regional.index)
+    if match is None or agg.values.empty:
+        return None
+    year = match.year or int(selected_year)
+    if year not in agg.values.columns:
+        return f"I don't have sector data for {year}. Available years: {', '.join(map(str, agg.years))}."
+    if match.sector and pd.isna(agg.values.at[match.sector, year]) and match.intent not in ("trend", "regional"):
+        return f"There is no {match.sector} record for {year}."
+    return _answer(match, agg, year)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import threading
+import time
+import streamlit as st
+from typing import Any, Dict, List, Optional, Tuple
+from database import ConnectionPool, get_pool
+
+RESPONSE_TTL_SECONDS = 24 * 60 * 60
+RESPONSE_CACHE_MAX_ENTRIES = 5000
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def make_cache_key(model: str, messages: List[Dict[str, str]], year: Any, context_hash: str) -> str:
+    """Key on the model, the normalized message window, the year and a hash of the prompt context."""
+    window = [[m["role"], _normalize(m["content"])] for m in messages]
+    payload = json.dumps([model, window, str(year), context_hash], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Assistant responses persisted in SQLite with a TTL and LRU eviction.
+
+    Hits only read: their last-used time and hit count are kept in memory and
+    written by the next `put`, which holds the writer anyway and needs them
+    up to date before evicting.
+    """
+
+    def __init__(self, pool: ConnectionPool, ttl_seconds: float = RESPONSE_TTL_SECONDS,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES) -> None:
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._touched: Dict[str, Tuple[float, int]] = {}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.pool.reader() as conn:
+            row = conn.execute("SELECT response FROM llm_response_cache WHERE key = ? AND created_at > ?",
+                               (key, now - self.ttl_seconds)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+            self._touched[key] = (now, self._touched.get(key, (now, 0))[1] + 1)
+        return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        with self.pool.writer() as conn:
+            conn.executemany("UPDATE llm_response_cache SET last_used_at = MAX(last_used_at, ?), hits = hits + ? WHERE key = ?",
+                             [(used_at, hits, key) for key, (used_at, hits) in touched.items()])
+            conn.execute("""
+                INSERT INTO llm_response_cache (key, model, response, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    model = excluded.model, response = excluded.response,
+                    created_at = excluded.created_at, last_used_at = excluded.last_used_at
+            """, (key, model, response, now, now))
+            evicted = conn.execute("DELETE FROM llm_response_cache WHERE created_at <= ?", (now - self.ttl_seconds,)).rowcount
+            evicted += conn.execute("""
+                DELETE FROM llm_response_cache WHERE key IN (
+                    SELECT key FROM llm_response_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+        self._count("stores")
+        self._count("evictions", evicted)
+
+    def stats(self) -> Dict[str, float]:
+        with self.pool.reader() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["entries"] = entries
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+@st.cache_resource
+def _get_response_cache(db_path: str, _pool: ConnectionPool) -> ResponseCache:
+    return ResponseCache(_pool)
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache on the current database."""
+    pool = get_pool()
+    return _get_response_cache(str(pool.db_path), pool)
@@ -0,0 +1,230 @@
+import json
+import sys
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import cache_miss, timed
+
+SECTOR_DTYPE = np.dtype([("id", "i8"), ("year", "i4"), ("sector_id", "i8"), ("value", "i8"), ("change", "f8"), ("subsector_id", "i8")])
+TOTALS_DTYPE = np.dtype([("id", "i8"), ("year", "i4"), ("total", "i8"), ("energy", "i8"), ("transport", "i8"), ("industry", "i8"), ("other", "i8")])
+REGIONAL_DTYPE = np.dtype([("year", "i4"), ("region_id", "i8"), ("value", "f8")])
+
+# (query, dtype, tiebreak column within a year); {where} restricts the years reloaded
+TABLES = {
+    "sector_emissions": ("SELECT id, year, sector_id, value, change, subsector_id FROM sector_emissions {where}", SECTOR_DTYPE, "id"),
+    "yearly_totals": ("SELECT id, year, total, energy, transport, industry, other FROM yearly_totals {where}", TOTALS_DTYPE, "id"),
+    "regional_data": ("SELECT year, region_id, value FROM regional_yearly {where}", REGIONAL_DTYPE, "region_id"),
+}
+YEARS_FILTER = "WHERE year IN (SELECT value FROM json_each(?))"
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+@dataclass(frozen=True)
+class YearColumns:
+    """One table as read-only column arrays sorted by year, so each year is a contiguous slice.
+
+    `years` is the year dictionary and `year_codes` each row's index into it;
+    `bounds[i]:bounds[i + 1]` are the rows of `years[i]`.
+    """
+    columns: Dict[str, np.ndarray]
+    years: np.ndarray
+    year_codes: np.ndarray
+    bounds: np.ndarray
+
+    @classmethod
+    def build(cls, columns: Dict[str, np.ndarray], tiebreak: str) -> "YearColumns":
+        order = np.lexsort((columns[tiebreak], columns["year"]))
+        columns = {name: _frozen(np.ascontiguousarray(values[order])) for name, values in columns.items()}
+        years, year_codes = np.unique(columns["year"], return_inverse=True)
+        bounds = np.append(np.searchsorted(columns["year"], years), len(columns["year"]))
+        return cls(columns, _frozen(years), _frozen(year_codes.astype(np.int16 if len(years) < 2 ** 15 else np.int32)), _frozen(bounds))
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, tiebreak: str) -> "YearColumns":
+        return cls.build({name: records[name] for name in records.dtype.names}, tiebreak)
+
+    def replace_years(self, years: Iterable[int], records: np.ndarray, tiebreak: str) -> "YearColumns":
+        """A copy with the rows of `years` replaced by `records`; other years are carried over as they are."""
+        keep = ~np.isin(self.columns["year"], np.fromiter(years, dtype=np.int64))
+        return self.build({name: np.concatenate([values[keep], records[name]]) for name, values in self.columns.items()}, tiebreak)
+
+    def rows(self, year: int) -> slice:
+        i = int(np.searchsorted(self.years, year))
+        if i == len(self.years) or self.years[i] != year:
+            return slice(0, 0)
+        return slice(int(self.bounds[i]), int(self.bounds[i + 1]))
+
+    def view(self, year: int) -> Dict[str, np.ndarray]:
+        """Zero-copy column slices for one year."""
+        rows = self.rows(year)
+        return {name: values[rows] for name, values in self.columns.items()}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values()) + self.years.nbytes + self.year_codes.nbytes + self.bounds.nbytes
+
+
+def _lookup(rows: List[Tuple[int, Any]]) -> np.ndarray:
+    """Dictionary array indexed by id, so codes decode with one fancy-indexing step."""
+    table = np.empty(max((id for id, _ in rows), default=-1) + 1, dtype=object)
+    for id, value in rows:
+        table[id] = value
+    return _frozen(table)
+
+
+def _object_nbytes(array: np.ndarray) -> int:
+    return array.nbytes + sum(sys.getsizeof(value) for value in array if value is not None)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """The dashboard's tables as of `versions`; never mutated, a refresh builds a new one."""
+    tables: Dict[str, YearColumns]
+    sector_names: np.ndarray
+    subsector_labels: np.ndarray
+    region_ids: np.ndarray
+    region_names: np.ndarray
+    region_colors: np.ndarray
+    versions: Dict[str, Dict[Optional[str], int]]
+
+    @property
+    def sectors(self) -> YearColumns:
+        return self.tables["sector_emissions"]
+
+    def year_total(self, year: int) -> int:
+        return int(self.sectors.view(year)["value"].sum())
+
+    def largest(self, year: int) -> Optional[Tuple[str, int]]:
+        """Largest sector of a year and its value, or None without data."""
+        view = self.sectors.view(year)
+        if not len(view["value"]):
+            return None
+        i = int(view["value"].argmax())
+        return self.sector_names[view["sector_id"][i]], int(view["value"][i])
+
+    def sector_frame(self, year: int) -> pd.DataFrame:
+        view = self.sectors.view(year)
+        return pd.DataFrame({
+            "sector": self.sector_names[view["sector_id"]],
+            "value": view["value"],
+            "change": view["change"],
+            "subsectors": self.subsector_labels[view["subsector_id"]],
+        })
+
+    @cached_property
+    def _by_year_and_name(self) -> np.ndarray:
+        """Row order by (year, sector name), computed once per snapshot."""
+        named = np.flatnonzero(self.sector_names != None)  # noqa: E711 - elementwise on an object array
+        rank = np.zeros(len(self.sector_names), dtype=np.int64)
+        rank[named[np.argsort(self.sector_names[named].astype(str), kind="stable")]] = np.arange(len(named))
+        return _frozen(np.lexsort((rank[self.sectors.columns["sector_id"]], self.sectors.columns["year"])))
+
+    def all_sectors_frame(self) -> pd.DataFrame:
+        columns = {name: values[self._by_year_and_name] for name, values in self.sectors.columns.items()}
+        return pd.DataFrame({
+            "id": columns["id"],
+            "year": columns["year"].astype(np.int64),
+            "sector": self.sector_names[columns["sector_id"]],
+            "value": columns["value"],
+            "change": columns["change"],
+            "subsectors": self.subsector_labels[columns["subsector_id"]],
+        })
+
+    def totals_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame(self.tables["yearly_totals"].columns)
+        frame["year"] = frame["year"].astype(np.int64)
+        return frame
+
+    @property
+    def regional_years(self) -> List[int]:
+        return self.tables["regional_data"].years.tolist()
+
+    def regional_frame(self, year: Optional[int] = None) -> pd.DataFrame:
+        """Every region with its total for `year` (the latest regional year by default), 0 where missing."""
+        regional = self.tables["regional_data"]
+        if year is None and len(regional.years):
+            year = int(regional.years[-1])
+        view = regional.view(year) if year is not None else {"region_id": np.empty(0, np.int64), "value": np.empty(0)}
+        values = np.zeros(len(self.region_ids))
+        values[np.searchsorted(self.region_ids, view["region_id"])] = view["value"]
+        return pd.DataFrame({"id": self.region_ids, "region": self.region_names, "value": values.round(2), "color": self.region_colors})
+
+    def memory(self) -> Dict[str, int]:
+        """Approximate bytes held, per table and for the name dictionaries."""
+        usage = {table: columns.nbytes for table, columns in self.tables.items()}
+        usage["dictionaries"] = sum(_object_nbytes(array) for array in
+                                    (self.sector_names, self.subsector_labels, self.region_names, self.region_colors))
+        usage["total"] = sum(usage.values())
+        return usage
+
+
+class SnapshotStore:
+    """Holds the current Snapshot and refreshes it when the data versions move.
+
+    Only tables whose generation changed are reloaded, and of those only the
+    years that were bumped; a bump without keys reloads the whole table.
+    """
+
+    def __init__(self, reader: Callable[[], Any], generations: Callable[[str], Dict[Optional[str], int]], full_key: str) -> None:
+        self._reader = reader
+        self._generations = generations
+        self._full_key = full_key
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Snapshot] = None
+        self.refreshes = 0
+
+    def _seen(self) -> Dict[str, Dict[Optional[str], int]]:
+        return {table: self._generations(table) for table in TABLES}
+
+    def current(self) -> Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.versions == self._seen():
+            return snapshot
+        with self._lock:
+            # Versions are read before the data, so a write landing meanwhile triggers another refresh
+            versions = self._seen()
+            if self._snapshot is None or self._snapshot.versions != versions:
+                self._snapshot = self._refresh(self._snapshot, versions)
+                self.refreshes += 1
+            return self._snapshot
+
+    def _changed_years(self, old: Dict[Optional[str], int], new: Dict[Optional[str], int]) -> Optional[List[int]]:
+        """Bumped years since `old`, or None if the whole table must be reloaded."""
+        if old.get(self._full_key) != new.get(self._full_key):
+            return None
+        return [int(key) for key, generation in new.items() if key not in (None, self._full_key) and old.get(key) != generation]
+
+    @timed("db.snapshot_refresh")
+    @cache_miss("snapshot")
+    def _refresh(self, previous: Optional[Snapshot], versions: Dict[str, Dict[Optional[str], int]]) -> Snapshot:
+        tables = {}
+        with self._reader() as conn:
+            for table, (query, dtype, tiebreak) in TABLES.items():
+                if previous is not None and previous.versions[table] == versions[table]:
+                    tables[table] = previous.tables[table]
+                    continue
+                years = None if previous is None else self._changed_years(previous.versions[table], versions[table])
+                if years is None:
+                    tables[table] = YearColumns.from_records(np.array(conn.execute(query.format(where="")).fetchall(), dtype=dtype), tiebreak)
+                else:
+                    rows = conn.execute(query.format(where=YEARS_FILTER), (json.dumps(years),)).fetchall()
+                    tables[table] = previous.tables[table].replace_years(years, np.array(rows, dtype=dtype), tiebreak)
+            sector_names = _lookup(conn.execute("SELECT id, name FROM sectors").fetchall())
+            subsector_labels = _lookup(conn.execute("SELECT id, label FROM subsectors").fetchall())
+            regions = conn.execute("SELECT id, name, color FROM regions ORDER BY id").fetchall()
+        return Snapshot(
+            tables, sector_names, subsector_labels,
+            _frozen(np.array([row[0] for row in regions], dtype=np.int64)),
+            _frozen(np.array([row[1] for row in regions], dtype=object)),
+            _frozen(np.array([row[2] for row in regions], dtype=object)),
+            versions,
+        )
@@ -0,0 +1,93 @@
+"""LLMGateway against fake_llm.StubAnthropicServer through the real anthropic SDK."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import anthropic
+import pytest
+
+from fake_llm import StubAnthropicServer
+from llm_client import LLMGateway
+
+REQUEST = {"model": "claude-stub", "max_tokens": 100,
+           "messages": [{"role": "user", "content": "Which sector emits the most?"}]}
+
+
+def make_gateway(server: StubAnthropicServer, max_concurrent: int = 2) -> LLMGateway:
+    client = anthropic.Anthropic(base_url=server.url, api_key="test", max_retries=0)
+    return LLMGateway(client, max_concurrent=max_concurrent, backoff_base=0.0)
+
+
+def assert_slots_free(gateway: LLMGateway) -> None:
+    assert gateway.stats()["active"] == 0
+    for _ in range(gateway.max_concurrent):
+        assert gateway._semaphore.acquire(timeout=1)
+    for _ in range(gateway.max_concurrent):
+        gateway._semaphore.release()
+
+
+def test_429_is_retried():
+    with StubAnthropicServer(latency=0.0, fail_first=2) as server:
+        gateway = make_gateway(server)
+        response = gateway.create("key", REQUEST)
+    assert response.content[0].text
+    assert len(server.requests) == 3
+    assert gateway.stats()["retries"] == 2
+
+
+def test_429_gives_up_after_max_retries():
+    with StubAnthropicServer(latency=0.0, fail_first=10) as server:
+        gateway = make_gateway(server)
+        gateway.max_retries = 1
+        with pytest.raises(anthropic.RateLimitError):
+            gateway.create("key", REQUEST)
+    assert len(server.requests) == 2
+    assert_slots_free(gateway)
+
+
+def test_identical_requests_are_coalesced():
+    callers = 5
+    with StubAnthropicServer(latency=0.3) as server:
+        gateway = make_gateway(server)
+        with ThreadPoolExecutor(callers) as pool:
+            replies = list(pool.map(lambda _: gateway.create("key", REQUEST).content[0].text, range(callers)))
+    assert len(set(replies)) == 1
+    assert len(server.requests) == 1
+    assert gateway.stats()["coalesced"] == callers - 1
+
+
+def test_stream_releases_slot_when_finished():
+    with StubAnthropicServer(latency=0.0) as server:
+        gateway = make_gateway(server, max_concurrent=1)
+        text = "".join(event.text for event in gateway.stream(REQUEST) if event.type == "text")
+        assert text
+        assert_slots_free(gateway)
+
+
+def test_stream_releases_slot_when_cancelled():
+    with StubAnthropicServer(latency=0.0, chunk_delay=0.01) as server:
+        gateway = make_gateway(server, max_concurrent=1)
+        events = gateway.stream(REQUEST, "key")
+        next(events)
+        assert gateway.stats()["active"] == 1
+        events.close()
+        assert_slots_free(gateway)
+        assert not gateway._streams
+
+
+def test_streams_with_the_same_key_are_coalesced():
+    callers = 4
+    start = threading.Barrier(callers)
+
+    def consume(_: int) -> str:
+        events = gateway.stream(REQUEST, "key")
+        start.wait()
+        return "".join(event.text for event in events if event.type == "text")
+
+    with StubAnthropicServer(latency=0.2, chunk_delay=0.01) as server:
+        gateway = make_gateway(server)
+        with ThreadPoolExecutor(callers) as pool:
+            replies = list(pool.map(consume, range(callers)))
+    assert len(set(replies)) == 1 and replies[0]
+    assert len(server.requests) == 1
+    assert gateway.stats()["coalesced"] == callers - 1
+    assert_slots_free(gateway)
@@ -0,0 +1,80 @@
+"""Migrating a database created by the pre-migration schema."""
+import sqlite3
+
+import pytest
+
+import database
+from migrations import MIGRATIONS, TOTALS_BUCKETS, _baseline_schema, current_version, run_migrations
+
+SECTORS = {"Energy Production": "Coal, Natural Gas, Oil", "Transportation": "Road, Aviation, Shipping",
+           "Waste": "Landfills, Wastewater"}
+
+
+def expected_totals(conn: sqlite3.Connection):
+    """yearly_totals as a GROUP BY over sector_emissions, with buckets taken from TOTALS_BUCKETS."""
+    buckets = " ".join(f"WHEN '{name}' THEN '{bucket}'" for name, bucket in TOTALS_BUCKETS.items())
+    return conn.execute(f"""
+        SELECT year, SUM(value),
+               SUM(CASE bucket WHEN 'energy' THEN value ELSE 0 END), SUM(CASE bucket WHEN 'transport' THEN value ELSE 0 END),
+               SUM(CASE bucket WHEN 'industry' THEN value ELSE 0 END), SUM(CASE bucket WHEN 'other' THEN value ELSE 0 END)
+        FROM (SELECT year, value, CASE sector {buckets} ELSE 'other' END AS bucket FROM sector_emission_rows)
+        GROUP BY year ORDER BY year
+    """).fetchall()
+
+
+def make_baseline_db(path) -> None:
+    conn = sqlite3.connect(path)
+    _baseline_schema(conn)
+    conn.executemany("INSERT INTO sector_emissions (year, sector, value, change, subsectors) VALUES (?, ?, ?, ?, ?)", [
+        ("2024", "Energy Production", 13800, 2.2, SECTORS["Energy Production"]),
+        ("2024", "Transportation", 8300, 2.5, SECTORS["Transportation"]),
+        ("2024", "Waste", 1400, 7.7, SECTORS["Waste"]),
+        ("2025", "Energy Production", 14000, 1.4, SECTORS["Energy Production"]),
+        ("2025", "Waste", 1500, 7.1, SECTORS["Waste"]),
+        # Added twice through the old form; the later row is the one kept
+        ("2025", "Waste", 1600, 6.7, SECTORS["Waste"]),
+    ])
+    # Hand-maintained totals that had drifted from the sector rows
+    conn.executemany("INSERT INTO yearly_totals (year, total, energy, transport, industry, other) VALUES (?, ?, ?, ?, ?, ?)", [
+        ("2024", 1, 1, 1, 1, 1), ("2025", 2, 2, 2, 2, 2),
+    ])
+    conn.executemany("INSERT INTO regional_data (region, value, color) VALUES (?, ?, ?)", [
+        ("Europe", 4200, "#8b5cf6"), ("Africa", 1200, "#06b6d4"),
+    ])
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_database_is_migrated(tmp_path):
+    path = tmp_path / "baseline.db"
+    make_baseline_db(path)
+    pool = database.ConnectionPool(path)
+
+    # Version 1 is the baseline schema itself, recorded without changing anything
+    assert run_migrations(pool) == [version for version, _, _ in MIGRATIONS]
+    assert run_migrations(pool) == []
+
+    with pool.reader() as conn:
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        rows = conn.execute("SELECT year, sector, value, change FROM sector_emission_rows ORDER BY year, sector").fetchall()
+        assert rows == [
+            (2024, "Energy Production", 13800, 2.2), (2024, "Transportation", 8300, 2.5), (2024, "Waste", 1400, 7.7),
+            (2025, "Energy Production", 14000, 1.4), (2025, "Waste", 1600, 6.7),
+        ]
+        assert conn.execute("SELECT year, total, energy, transport, industry, other FROM yearly_totals ORDER BY year").fetchall() \
+            == expected_totals(conn)
+        # The undated regional snapshot lands in the latest sector year
+        assert conn.execute("SELECT year, name, value FROM regional_yearly JOIN regions ON regions.id = region_id ORDER BY name").fetchall() \
+            == [(2025, "Africa", 1200.0), (2025, "Europe", 4200.0)]
+
+
+def test_duplicate_year_sector_is_rejected_after_migration(tmp_path):
+    path = tmp_path / "baseline.db"
+    make_baseline_db(path)
+    pool = database.ConnectionPool(path)
+    run_migrations(pool)
+
+    with pool.writer() as conn:
+        sector_id = conn.execute("SELECT id FROM sectors WHERE name = 'Waste'").fetchone()[0]
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO sector_emissions (year, sector_id, value, change, subsector_id) VALUES (2025, ?, 1, 0, 1)", (sector_id,))
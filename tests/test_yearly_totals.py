@@ -0,0 +1,87 @@
+"""yearly_totals kept equal to a GROUP BY over sector_emissions by the triggers and the bulk paths."""
+import io
+
+import pytest
+
+import database
+from tests.test_migrations import expected_totals
+
+
+@pytest.fixture(autouse=True)
+def seeded_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "emissions.db")
+    database.init_database.clear()
+    database.init_database()
+    yield
+    database.get_write_queue().close()
+    database.init_database.clear()
+
+
+def totals():
+    with database.get_pool().reader() as conn:
+        return conn.execute("SELECT year, total, energy, transport, industry, other FROM yearly_totals ORDER BY year").fetchall()
+
+
+def assert_consistent():
+    with database.get_pool().reader() as conn:
+        assert totals() == expected_totals(conn)
+        assert conn.execute("SELECT deferred FROM totals_maintenance").fetchone()[0] == 0
+
+
+def row_id(year: int, sector: str) -> int:
+    with database.get_pool().reader() as conn:
+        return conn.execute("SELECT id FROM sector_emission_rows WHERE year = ? AND sector = ?", (year, sector)).fetchone()[0]
+
+
+def test_seed_data():
+    assert len(totals()) == 5
+    assert_consistent()
+
+
+def test_add():
+    database.add_sector_emission("2025", "Transportation", 9000, 5.9, "Road, Aviation, Shipping").result()
+    database.add_sector_emission("2026", "Aviation", 1000, 0.0, "Jet fuel").result()
+    assert_consistent()
+    assert totals()[-1] == (2026, 1000, 0, 0, 0, 1000)
+
+
+def test_update():
+    database.update_sector_emission(row_id(2025, "Waste"), "2025", "Waste", 2500, 0.0, "Landfills, Wastewater").result()
+    assert_consistent()
+    # Moving a row to another year and into another bucket adjusts both years
+    database.update_sector_emission(row_id(2024, "Buildings"), "2026", "Energy Production", 100, 0.0, "Coal").result()
+    assert_consistent()
+
+
+def test_delete():
+    database.delete_sector_emission(row_id(2025, "Energy Production")).result()
+    assert_consistent()
+    for sector in ("Industrial Process", "Transportation", "Agriculture", "Buildings", "Waste"):
+        database.delete_sector_emission(row_id(2025, sector)).result()
+    # A year whose last row is deleted has no totals row
+    assert [year for year, *_ in totals()] == [2021, 2022, 2023, 2024]
+    assert_consistent()
+
+
+def test_import_sector_csv():
+    csv = (b"year,sector,value,change\n"
+           b"2025,Energy Production,15000,7.1\n"
+           b"2025,Shipping,900,\n"
+           b"2027,Transportation,8700,\n"
+           b"not a year,Waste,1,0\n")
+    report = database.import_sector_csv(io.BytesIO(csv))
+    assert (report.rows_imported, report.rows_rejected) == (3, 1)
+    assert_consistent()
+
+
+def test_rebuild_yearly_totals():
+    with database.get_pool().writer() as conn:
+        conn.execute("UPDATE totals_maintenance SET deferred = 1")
+        conn.execute("UPDATE sector_emissions SET value = value + 1")
+        conn.execute("UPDATE totals_maintenance SET deferred = 0")
+        conn.execute("DELETE FROM yearly_totals WHERE year = 2021")
+    database.rebuild_yearly_totals([2022, 2023])
+    with database.get_pool().reader() as conn:
+        assert totals() != expected_totals(conn)
+    database.rebuild_yearly_totals()
+    assert_consistent()